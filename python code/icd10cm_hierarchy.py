@@ -7,14 +7,34 @@ It uses the NLM Clinical Tables API to fetch ICD-10-CM code data and organizes
 them into a tree structure.
 """
 
+import io
 import json
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from xml.sax.saxutils import escape
 import requests
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, TextIO
 import argparse
 import sys
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Number of concurrent API lookups (also used as the connection pool size)
+MAX_WORKERS = 16
+
+# Extra escapes for attribute values, matching ElementTree's output
+_XML_ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+
+# minidom's pretty printer also escapes quotes in text nodes
+_XML_TEXT_ENTITIES = {'"': '&quot;'}
+
+# Hierarchy level indexed by code length without dots; 7+ characters is level 5
+_LEVEL_BY_LEN = (1, 1, 1, 1, 2, 3, 4)
+
 
 class ICD10CMHierarchy:
     """Builds and manages ICD-10-CM code hierarchy"""
@@ -24,6 +44,12 @@ class ICD10CMHierarchy:
         self.hierarchy = {}
         self.api_base = "https://clinicaltables.nlm.nih.gov/api/icd10cm/v3/search"
         
+        # Reuse keep-alive connections across lookups
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
     def fetch_code_data(self, code: str) -> Optional[Dict]:
         """Fetch data for a specific ICD-10-CM code from NLM API"""
         try:
@@ -33,7 +59,7 @@ class ICD10CMHierarchy:
                 'terms': code,
                 'maxList': 1
             }
-            response = requests.get(self.api_base, params=params, timeout=10)
+            response = self.session.get(self.api_base, params=params, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if data and len(data) > 3 and data[3]:
@@ -46,103 +72,66 @@ class ICD10CMHierarchy:
             print(f"Error fetching code {code}: {e}", file=sys.stderr)
         return None
     
+    def fetch_all(self, codes: List[str]) -> None:
+        """Fetch data for all codes concurrently and populate self.codes"""
+        missing = [code for code in dict.fromkeys(codes) if code not in self.codes]
+        if not missing:
+            return
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(self.fetch_code_data, missing)
+            for code, data in zip(missing, results):
+                if data:
+                    self.codes[code] = data
+                else:
+                    # Create placeholder if API fails
+                    self.codes[code] = {'code': code, 'name': f'ICD-10-CM Code {code}'}
+    
     def get_code_level(self, code: str) -> int:
         """Determine the hierarchy level of a code"""
-        # Remove dots for analysis
-        clean_code = code.replace('.', '')
-        if len(clean_code) <= 3:
-            return 1  # Category level (e.g., A00)
-        elif len(clean_code) <= 4:
-            return 2  # Subcategory level
-        elif len(clean_code) <= 5:
-            return 3  # 5th character
-        elif len(clean_code) <= 6:
-            return 4  # 6th character
-        else:
-            return 5  # 7th character
-    
-    def get_parent_code(self, code: str, available_codes: set) -> Optional[str]:
-        """Get the parent code in the hierarchy"""
-        clean_code = code.replace('.', '')
-        
-        # For codes longer than 3 characters, find the parent by removing characters
-        if len(clean_code) > 3:
-            # Try different parent levels
-            # First try removing last character
-            for i in range(len(clean_code) - 1, 2, -1):
-                parent_clean = clean_code[:i]
-                # Try with and without dot
-                parent_with_dot = parent_clean[:3] + '.' + parent_clean[3:] if len(parent_clean) > 3 else parent_clean
-                parent_no_dot = parent_clean
-                
-                # Check if parent exists in available codes
-                if parent_with_dot in available_codes:
-                    return parent_with_dot
-                if parent_no_dot in available_codes:
-                    return parent_no_dot
-            
-            # If no exact match, construct parent (3-char base)
-            if len(clean_code) >= 3:
-                return clean_code[:3]
-        
-        # Top level codes (3 characters) have no parent
-        return None
+        # Level by length without dots: 3 chars is the category (e.g., A00), then
+        # one level per extra character up to the 7th character
+        clean_len = len(code) - code.count('.')
+        return _LEVEL_BY_LEN[clean_len] if clean_len < len(_LEVEL_BY_LEN) else 5
     
     def build_hierarchy_from_codes(self, codes: List[str]) -> Dict:
         """Build hierarchy from a list of codes"""
         # First, fetch all code data
         print("Fetching code data...", file=sys.stderr)
-        available_codes = set(codes)
+        self.fetch_all(codes)
         
-        for code in codes:
-            if code not in self.codes:
-                data = self.fetch_code_data(code)
-                if data:
-                    self.codes[code] = data
-                else:
-                    # Create placeholder if API fails
-                    self.codes[code] = {'code': code, 'name': f'ICD-10-CM Code {code}'}
-        
-        # Build hierarchy tree - process codes in order from shortest to longest
-        sorted_codes = sorted(codes, key=lambda x: (len(x.replace('.', '')), x))
+        # Build hierarchy tree - process codes in order from shortest to longest,
+        # so every possible parent is already indexed when its children arrive
+        sorted_codes = sorted(codes, key=lambda x: (len(x) - x.count('.'), x))
         hierarchy = {}
-        all_nodes = {}
+        nodes_by_clean = {}
         
         for code in sorted_codes:
             data = self.codes[code]
-            level = self.get_code_level(code)
-            parent_code = self.get_parent_code(code, available_codes)
-            
             node = {
                 'code': code,
                 'name': data.get('name', ''),
-                'level': level,
+                'level': self.get_code_level(code),
                 'children': {}
             }
-            all_nodes[code] = node
             
-            if parent_code and parent_code in all_nodes:
-                # Add as child of existing parent
-                all_nodes[parent_code]['children'][code] = node
-            elif parent_code and parent_code in self.codes:
-                # Parent exists in codes but not yet processed - create it
-                parent_data = self.codes[parent_code]
-                parent_node = {
-                    'code': parent_code,
-                    'name': parent_data.get('name', ''),
-                    'level': self.get_code_level(parent_code),
-                    'children': {code: node}
-                }
-                all_nodes[parent_code] = parent_node
-                # Check if this parent has a parent
-                grandparent = self.get_parent_code(parent_code, available_codes)
-                if grandparent and grandparent in all_nodes:
-                    all_nodes[grandparent]['children'][parent_code] = parent_node
-                elif not grandparent:
-                    hierarchy[parent_code] = parent_node
+            # ICD-10-CM codes only carry a dot after the 3-character category
+            clean_code = code[:3] + code[4:] if code[3:4] == '.' else code
+            
+            # The parent is the longest strict prefix (of at least 3 characters)
+            # that is itself a code
+            parent = None
+            for i in range(len(clean_code) - 1, 2, -1):
+                parent = nodes_by_clean.get(clean_code[:i])
+                if parent is not None:
+                    break
+            
+            if parent is not None:
+                parent['children'][code] = node
             else:
-                # Top level node (no parent or parent not in available codes)
+                # Top level node (no parent in available codes)
                 hierarchy[code] = node
+            nodes_by_clean[clean_code] = node
         
         self.hierarchy = hierarchy
         return hierarchy
@@ -193,50 +182,91 @@ class ICD10CMHierarchy:
     def to_json(self, pretty: bool = True) -> str:
         """Convert hierarchy to JSON format"""
         def serialize_node(node):
-            """Recursively serialize node and children"""
+            """Serialize node and children using an explicit stack"""
             result = {
                 'code': node['code'],
                 'name': node['name'],
                 'level': node['level']
             }
-            if node['children']:
-                result['children'] = [serialize_node(child) for child in node['children'].values()]
+            stack = [(node, result)]
+            while stack:
+                src, dest = stack.pop()
+                if src['children']:
+                    children = []
+                    for child in src['children'].values():
+                        child_result = {
+                            'code': child['code'],
+                            'name': child['name'],
+                            'level': child['level']
+                        }
+                        children.append(child_result)
+                        stack.append((child, child_result))
+                    dest['children'] = children
             return result
         
         root_nodes = [serialize_node(node) for node in self.hierarchy.values()]
         
+        output = {'icd10cm': {'codes': root_nodes}}
         if pretty:
-            return json.dumps({'icd10cm': {'codes': root_nodes}}, indent=2, ensure_ascii=False)
+            if HAS_ORJSON:
+                return orjson.dumps(output, option=orjson.OPT_INDENT_2).decode('utf-8')
+            return json.dumps(output, indent=2, ensure_ascii=False)
         else:
-            return json.dumps({'icd10cm': {'codes': root_nodes}}, ensure_ascii=False)
+            # orjson has no spaced separators, so the compact form stays on
+            # json to keep its ", " / ": " output
+            return json.dumps(output, ensure_ascii=False)
     
     def to_xml(self, pretty: bool = True) -> str:
         """Convert hierarchy to XML format"""
-        root = ET.Element('icd10cm')
+        buffer = io.StringIO()
+        self.write_xml(buffer, pretty=pretty)
+        return buffer.getvalue()
+    
+    def write_xml(self, f: TextIO, pretty: bool = True) -> None:
+        """Write hierarchy as XML to a text file, without building an element tree"""
+        newline = '\n' if pretty else ''
+        indent = '  ' if pretty else ''
+        # Pretty output follows minidom (<tag/>, &quot; in text), compact
+        # output follows ElementTree (<tag />)
+        empty_end = '/>' if pretty else ' />'
+        text_entities = _XML_TEXT_ENTITIES if pretty else {}
         
-        def add_node(parent, node):
-            """Recursively add node and children to XML"""
-            code_elem = ET.SubElement(parent, 'code')
-            code_elem.set('value', node['code'])
-            code_elem.set('level', str(node['level']))
+        if pretty:
+            f.write('<?xml version="1.0" ?>\n')
+        if not self.hierarchy:
+            f.write('<icd10cm' + empty_end + newline)
+            return
+        f.write('<icd10cm>' + newline)
+        
+        # Stack entries are either (node, depth) to open, or a closing tag string
+        stack = [(node, 1) for node in reversed(list(self.hierarchy.values()))]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                f.write(item)
+                continue
             
-            name_elem = ET.SubElement(code_elem, 'name')
-            name_elem.text = node['name']
+            node, depth = item
+            pad = indent * depth
+            inner_pad = indent * (depth + 1)
+            f.write(f'{pad}<code value="{escape(node["code"], _XML_ATTR_ENTITIES)}" level="{node["level"]}">{newline}')
+            if node['name']:
+                f.write(f'{inner_pad}<name>{escape(node["name"], text_entities)}</name>{newline}')
+            else:
+                f.write(f'{inner_pad}<name{empty_end}{newline}')
             
+            closing = f'{pad}</code>{newline}'
             if node['children']:
-                children_elem = ET.SubElement(code_elem, 'children')
-                for child in node['children'].values():
-                    add_node(children_elem, child)
-        
-        for node in self.hierarchy.values():
-            add_node(root, node)
+                f.write(f'{inner_pad}<children>{newline}')
+                closing = f'{inner_pad}</children>{newline}' + closing
+                stack.append(closing)
+                # Push in reverse so children are emitted in their original order
+                for child in reversed(list(node['children'].values())):
+                    stack.append((child, depth + 2))
+            else:
+                stack.append(closing)
         
-        if pretty:
-            rough_string = ET.tostring(root, encoding='unicode')
-            reparsed = minidom.parseString(rough_string)
-            return reparsed.toprettyxml(indent="  ")
-        else:
-            return ET.tostring(root, encoding='unicode')
+        f.write('</icd10cm>' + newline)
 
 
 def main():
@@ -296,10 +326,9 @@ def main():
         print(f"JSON hierarchy written to {json_path}", file=sys.stderr)
     
     if args.format in ['xml', 'both']:
-        xml_output = hierarchy_builder.to_xml(pretty=True)
         xml_path = os.path.join(args.output_dir, 'icd10cm_hierarchy.xml')
         with open(xml_path, 'w', encoding='utf-8') as f:
-            f.write(xml_output)
+            hierarchy_builder.write_xml(f, pretty=True)
         print(f"XML hierarchy written to {xml_path}", file=sys.stderr)
     
     print("Done!", file=sys.stderr)
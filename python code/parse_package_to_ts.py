@@ -7,6 +7,17 @@ import csv
 import re
 from typing import List, Dict, Tuple
 
+# Patterns used by extract_package_size, compiled once at import
+# Count/unit before the first slash and volume/strength after it, in one match
+_SLASH_VOLUME_RE = re.compile(
+    r'^\s*(?:(?P<count>\d+)\s+(?P<unit>VIAL|SYRINGE|PEN|TABLET|CAPSULE))?'
+    r'[^/]*/[^/]*?(?P<volume>[\d.]+(?:\s*(?:mL|mg|units?|g|mcg|IU)))',
+    re.IGNORECASE
+)
+_COUNT_UNIT_RE = re.compile(r'^(\d+)\s+((?:TABLET|CAPSULE|VIAL|SYRINGE|PEN|BOTTLE|CARTON|CAN|PACKAGE|DOSE)[^/]*)', re.IGNORECASE)
+_PARENS_RE = re.compile(r'\s*\([^)]+\)\s*')
+_WS_RE = re.compile(r'\s+')
+
 
 def extract_package_size(description: str) -> str:
     """Extract package size information from package description"""
@@ -19,38 +30,30 @@ def extract_package_size(description: str) -> str:
     # "28 TABLET, FILM COATED in 1 BOTTLE (0002-1717-28)" -> "28 tablets"
     # "4 VIAL, SINGLE-DOSE in 1 CARTON (0002-0152-04)  / .5 mL in 1 VIAL" -> "4 vials, .5 mL"
     
-    # First, try to get the volume/strength after the slash
-    if '/' in description:
-        parts = description.split('/')
-        if len(parts) > 1:
-            after_slash = parts[1].strip()
-            # Extract volume/strength info
-            volume_match = re.search(r'([\d.]+(?:\s*(?:mL|mg|units?|g|mcg|IU)))', after_slash, re.IGNORECASE)
-            if volume_match:
-                volume = volume_match.group(1).strip()
-                # Also try to get the count from before the slash
-                before_slash = parts[0].strip()
-                count_match = re.search(r'^(\d+)\s+(?:VIAL|SYRINGE|PEN|TABLET|CAPSULE)', before_slash, re.IGNORECASE)
-                if count_match:
-                    count = count_match.group(1)
-                    unit = re.search(r'(VIAL|SYRINGE|PEN|TABLET|CAPSULE|BOTTLE|CARTON)', before_slash, re.IGNORECASE)
-                    unit_str = unit.group(1).lower() + ('s' if int(count) > 1 else '') if unit else ''
-                    return f"{count} {unit_str}, {volume}".strip(', ')
-                return volume
+    # First, try to get the volume/strength after the slash, along with the
+    # count from before the slash
+    slash_match = _SLASH_VOLUME_RE.match(description) if '/' in description else None
+    if slash_match:
+        volume = slash_match.group('volume')
+        count = slash_match.group('count')
+        if count:
+            unit_str = slash_match.group('unit').lower() + ('s' if int(count) > 1 else '')
+            return f"{count} {unit_str}, {volume}".strip(', ')
+        return volume
     
     # If no slash, try to extract count and unit
-    count_match = re.search(r'^(\d+)\s+((?:TABLET|CAPSULE|VIAL|SYRINGE|PEN|BOTTLE|CARTON|CAN|PACKAGE|DOSE)[^/]*)', description, re.IGNORECASE)
+    count_match = _COUNT_UNIT_RE.search(description)
     if count_match:
         count = count_match.group(1)
         unit_part = count_match.group(2).strip()
         # Clean up unit part
-        unit_part = re.sub(r'\s*\([^)]+\)\s*', '', unit_part)  # Remove NDC codes in parentheses
-        unit_part = re.sub(r'\s+', ' ', unit_part)
+        unit_part = _PARENS_RE.sub('', unit_part)  # Remove NDC codes in parentheses
+        unit_part = _WS_RE.sub(' ', unit_part)
         return f"{count} {unit_part}"
     
     # Fallback: return first 60 chars, cleaned up
-    cleaned = re.sub(r'\s+', ' ', description)
-    cleaned = re.sub(r'\s*\([^)]+\)\s*', ' ', cleaned)  # Remove NDC codes in parentheses
+    cleaned = _WS_RE.sub(' ', description)
+    cleaned = _PARENS_RE.sub(' ', cleaned)  # Remove NDC codes in parentheses
     return cleaned[:60].strip() if cleaned else ""
 
 
@@ -65,6 +68,17 @@ def format_ndc_code(ndc_code: str) -> str:
     return ndc_code
 
 
+def read_columns(reader, columns: Tuple[str, ...], source: str) -> List[int]:
+    """Read the header row and return the position of each column, in order"""
+    header = next(reader, None)
+    if header is None:
+        raise ValueError(f"{source} is empty")
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"{source} is missing column(s): {', '.join(missing)}")
+    return [header.index(column) for column in columns]
+
+
 def load_product_data(product_file: str) -> Tuple[Dict[str, str], Dict[str, str]]:
     """Load manufacturer and brand name mappings from product file"""
     manufacturer_map = {}
@@ -74,17 +88,29 @@ def load_product_data(product_file: str) -> Tuple[Dict[str, str], Dict[str, str]
     
     try:
         with open(product_file, 'r', encoding='utf-8', errors='ignore') as f:
-            reader = csv.DictReader(f, delimiter='\t')
+            reader = csv.reader(f, delimiter='\t')
+            
+            # Resolve column positions once from the header row
+            idx_prod, idx_labeler, idx_name, idx_suffix, idx_excl = read_columns(
+                reader,
+                ('PRODUCTNDC', 'LABELERNAME', 'PROPRIETARYNAME', 'PROPRIETARYNAMESUFFIX', 'NDC_EXCLUDE_FLAG'),
+                product_file,
+            )
+            min_len = max(idx_prod, idx_labeler, idx_name, idx_suffix, idx_excl) + 1
             
             for row_num, row in enumerate(reader, start=2):
                 if row_num % 10000 == 0:
                     print(f"Processed {row_num} product rows...", file=__import__('sys').stderr)
                 
-                product_ndc = row.get('PRODUCTNDC', '').strip()
-                labeler_name = row.get('LABELERNAME', '').strip()
-                proprietary_name = row.get('PROPRIETARYNAME', '').strip()
-                proprietary_suffix = row.get('PROPRIETARYNAMESUFFIX', '').strip()
-                ndc_exclude_flag = row.get('NDC_EXCLUDE_FLAG', '').strip()
+                # Skip blank or truncated rows
+                if len(row) < min_len:
+                    continue
+                
+                product_ndc = row[idx_prod].strip()
+                labeler_name = row[idx_labeler].strip()
+                proprietary_name = row[idx_name].strip()
+                proprietary_suffix = row[idx_suffix].strip()
+                ndc_exclude_flag = row[idx_excl].strip()
                 
                 # Skip excluded products
                 if ndc_exclude_flag == 'Y':
@@ -106,27 +132,42 @@ def load_product_data(product_file: str) -> Tuple[Dict[str, str], Dict[str, str]
         print(f"Loaded {len(brand_name_map)} product-to-brand-name mappings", file=__import__('sys').stderr)
     except FileNotFoundError:
         print(f"Warning: {product_file} not found, product data will be empty", file=__import__('sys').stderr)
+    except ValueError as e:
+        print(f"Warning: {e}, product data will be empty", file=__import__('sys').stderr)
     
     return manufacturer_map, brand_name_map
 
 
 def parse_package_file(input_file: str, manufacturer_map: Dict[str, str], brand_name_map: Dict[str, str]) -> List[Dict]:
-    """Parse package.txt and extract NDC codes"""
-    ndc_codes = []
+    """Parse package.txt and extract NDC codes, keeping the first row for each code"""
+    ndc_codes = {}
+    duplicates = 0
     
     print(f"Reading {input_file}...", file=__import__('sys').stderr)
     
     with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-        reader = csv.DictReader(f, delimiter='\t')
+        reader = csv.reader(f, delimiter='\t')
+        
+        # Resolve column positions once from the header row
+        idx_ndc, idx_desc, idx_prod, idx_excl = read_columns(
+            reader,
+            ('NDCPACKAGECODE', 'PACKAGEDESCRIPTION', 'PRODUCTNDC', 'NDC_EXCLUDE_FLAG'),
+            input_file,
+        )
+        min_len = max(idx_ndc, idx_desc, idx_prod, idx_excl) + 1
         
         for row_num, row in enumerate(reader, start=2):
             if row_num % 10000 == 0:
                 print(f"Processed {row_num} rows...", file=__import__('sys').stderr)
             
-            ndc_package_code = row.get('NDCPACKAGECODE', '').strip()
-            package_description = row.get('PACKAGEDESCRIPTION', '').strip()
-            product_ndc = row.get('PRODUCTNDC', '').strip()
-            ndc_exclude_flag = row.get('NDC_EXCLUDE_FLAG', '').strip()
+            # Skip blank or truncated rows
+            if len(row) < min_len:
+                continue
+            
+            ndc_package_code = row[idx_ndc].strip()
+            package_description = row[idx_desc].strip()
+            product_ndc = row[idx_prod].strip()
+            ndc_exclude_flag = row[idx_excl].strip()
             
             # Skip excluded codes
             if ndc_exclude_flag == 'Y':
@@ -138,6 +179,11 @@ def parse_package_file(input_file: str, manufacturer_map: Dict[str, str], brand_
             # Format the NDC code
             formatted_code = format_ndc_code(ndc_package_code)
             
+            # Skip duplicates based on code
+            if formatted_code in ndc_codes:
+                duplicates += 1
+                continue
+            
             # Extract package size from package description
             package_size = extract_package_size(package_description) if package_description else ""
             
@@ -150,49 +196,50 @@ def parse_package_file(input_file: str, manufacturer_map: Dict[str, str], brand_
                 # Fallback to package description if no brand name available
                 brand_name = package_description
             
-            ndc_codes.append({
+            ndc_codes[formatted_code] = {
                 'code': formatted_code,
                 'name': brand_name,
                 'manufacturer': manufacturer,
                 'packageSize': package_size
-            })
+            }
     
-    print(f"Found {len(ndc_codes)} NDC codes", file=__import__('sys').stderr)
-    return ndc_codes
+    print(f"Found {len(ndc_codes) + duplicates} NDC codes", file=__import__('sys').stderr)
+    print(f"Removed {duplicates} duplicate codes", file=__import__('sys').stderr)
+    return list(ndc_codes.values())
+
+
+def escape_string(s: str) -> str:
+    """Escape a string for a TypeScript string literal (newlines, quotes, backslashes)"""
+    if not s:
+        return ""
+    # Chained str.replace is kept on purpose: most fields contain none of these
+    # characters, and a replace that finds nothing returns without copying, which
+    # makes this several times faster than a single str.translate pass
+    return s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
 
 
 def generate_typescript(ndc_codes: List[Dict], output_file: str):
     """Generate TypeScript file from NDC codes"""
     print(f"Generating TypeScript file: {output_file}", file=__import__('sys').stderr)
     
-    # Escape strings for TypeScript (handle newlines, quotes, backslashes)
-    def escape_string(s: str) -> str:
-        if not s:
-            return ""
-        # Replace backslashes first
-        s = s.replace('\\', '\\\\')
-        # Replace double quotes
-        s = s.replace('"', '\\"')
-        # Replace newlines
-        s = s.replace('\n', '\\n').replace('\r', '\\r')
-        # Replace tabs
-        s = s.replace('\t', '\\t')
-        return s
+    lines = [
+        'export interface NDCCode {\n',
+        '  code: string;\n',
+        '  name: string;\n',
+        '  manufacturer: string;\n',
+        '  packageSize: string;\n',
+        '}\n\n',
+        'export const ndcCodes: NDCCode[] = [\n',
+    ]
+    # Trailing commas are valid in TypeScript array literals, so every row gets one
+    lines.extend(
+        f'  {{ code: "{code["code"]}", name: "{escape_string(code["name"])}", manufacturer: "{escape_string(code["manufacturer"])}", packageSize: "{escape_string(code["packageSize"])}" }},\n'
+        for code in ndc_codes
+    )
+    lines.append('];\n')
     
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('export interface NDCCode {\n')
-        f.write('  code: string;\n')
-        f.write('  name: string;\n')
-        f.write('  manufacturer: string;\n')
-        f.write('  packageSize: string;\n')
-        f.write('}\n\n')
-        f.write('export const ndcCodes: NDCCode[] = [\n')
-        
-        for i, code in enumerate(ndc_codes):
-            comma = ',' if i < len(ndc_codes) - 1 else ''
-            f.write(f'  {{ code: "{code["code"]}", name: "{escape_string(code["name"])}", manufacturer: "{escape_string(code["manufacturer"])}", packageSize: "{escape_string(code["packageSize"])}" }}{comma}\n')
-        
-        f.write('];\n')
+        f.writelines(lines)
     
     print(f"Successfully generated {output_file} with {len(ndc_codes)} codes", file=__import__('sys').stderr)
 
@@ -209,21 +256,12 @@ def main():
         # Parse package file with product data
         ndc_codes = parse_package_file(input_file, manufacturer_map, brand_name_map)
         
-        # Remove duplicates based on code
-        seen = set()
-        unique_codes = []
-        for code in ndc_codes:
-            if code['code'] not in seen:
-                seen.add(code['code'])
-                unique_codes.append(code)
-        
-        print(f"Removed {len(ndc_codes) - len(unique_codes)} duplicate codes", file=__import__('sys').stderr)
-        print(f"Final count: {len(unique_codes)} unique codes", file=__import__('sys').stderr)
+        print(f"Final count: {len(ndc_codes)} unique codes", file=__import__('sys').stderr)
         
         # Sort by code
-        unique_codes.sort(key=lambda x: x['code'])
+        ndc_codes.sort(key=lambda x: x['code'])
         
-        generate_typescript(unique_codes, output_file)
+        generate_typescript(ndc_codes, output_file)
         
     except Exception as e:
         print(f"Error: {e}", file=__import__('sys').stderr)
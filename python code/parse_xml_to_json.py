@@ -4,29 +4,68 @@ Parse ICD-10-CM XML file and generate complete JSON hierarchy
 """
 
 import json
-import xml.etree.ElementTree as ET
+from array import array
+from lxml import etree
 from typing import Dict, List, Optional
 import sys
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Hierarchy level indexed by code length without dots; 7+ characters is level 5
+_LEVEL_BY_LEN = (1, 1, 1, 1, 2, 3, 4)
+
 
 def get_code_level(code: str) -> int:
     """Determine the hierarchy level of a code"""
-    # Remove dots for analysis
-    clean_code = code.replace('.', '')
-    if len(clean_code) <= 3:
-        return 1  # Category level (e.g., A00)
-    elif len(clean_code) <= 4:
-        return 2  # Subcategory level (e.g., A00.0)
-    elif len(clean_code) <= 5:
-        return 3  # 5th character (e.g., A00.00)
-    elif len(clean_code) <= 6:
-        return 4  # 6th character (e.g., A00.000)
-    else:
-        return 5  # 7th character (e.g., A00.0000)
-
-
-def parse_diag_element(diag_elem: ET.Element) -> Optional[Dict]:
-    """Recursively parse diag elements from XML, preserving hierarchy"""
+    # Level by length without dots: 3 chars is the category (e.g., A00), then
+    # one level per extra character up to the 7th character
+    clean_len = len(code) - code.count('.')
+    return _LEVEL_BY_LEN[clean_len] if clean_len < len(_LEVEL_BY_LEN) else 5
+
+
+class DiagTree:
+    """Flat storage for the parsed code hierarchy
+    
+    Nodes are integer indices into parallel lists rather than one dict per
+    node. Children are linked first-child/next-sibling style, with -1
+    marking the end of a chain.
+    """
+    
+    def __init__(self):
+        self.codes: List[str] = []
+        self.names: List[str] = []
+        self.levels = array('b')
+        self.first_child: List[int] = []
+        self.next_sibling: List[int] = []
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def add(self, code: str, name: str) -> int:
+        """Append a node without children and return its index"""
+        self.codes.append(code)
+        self.names.append(name)
+        self.levels.append(get_code_level(code))
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.codes) - 1
+    
+    def link_children(self, parent: int, children: List[int]) -> None:
+        """Attach children to parent in the given order"""
+        if not children:
+            return
+        self.first_child[parent] = children[0]
+        next_sibling = self.next_sibling
+        for prev, child in zip(children, children[1:]):
+            next_sibling[prev] = child
+
+
+def _add_diag(tree: DiagTree, diag_elem: etree._Element) -> Optional[int]:
+    """Add a node for a single diag element, without its children"""
     name_elem = diag_elem.find('name')
     desc_elem = diag_elem.find('desc')
     
@@ -39,36 +78,64 @@ def parse_diag_element(diag_elem: ET.Element) -> Optional[Dict]:
     if not code:
         return None
     
-    # Get level for this code
-    level = get_code_level(code)
+    return tree.add(code, desc)
+
+
+def parse_diag_element(tree: DiagTree, diag_elem: etree._Element) -> Optional[int]:
+    """Parse diag elements from XML into tree, preserving hierarchy
     
-    # Recursively process child diag elements
-    children = {}
-    for child_diag in diag_elem.findall('diag'):
-        child_node = parse_diag_element(child_diag)
-        if child_node:
-            children[child_node['code']] = child_node
+    Nested diag elements are walked with an explicit stack rather than
+    recursion, so deep subtrees don't pay a Python frame per node. Each
+    node's children are linked in code order. Returns the index of the
+    top node, or None if the element has no code.
+    """
+    root_index = _add_diag(tree, diag_elem)
+    if root_index is None:
+        return None
     
-    # Create node
-    node = {
-        'code': code,
-        'name': desc,
-        'level': level,
-        'children': children
-    }
+    codes = tree.codes
+    stack = [(diag_elem, root_index)]
+    while stack:
+        elem, index = stack.pop()
+        children = []
+        for child_diag in elem.findall('diag'):
+            child_index = _add_diag(tree, child_diag)
+            if child_index is not None:
+                children.append(child_index)
+                stack.append((child_diag, child_index))
+        # Sort once here so serialization can follow the sibling chain as-is
+        children.sort(key=codes.__getitem__)
+        tree.link_children(index, children)
     
-    return node
+    return root_index
 
 
-def serialize_node(node: Dict) -> Dict:
-    """Recursively serialize node and children for JSON output"""
+def serialize_node(tree: DiagTree, index: int) -> Dict:
+    """Serialize node and children for JSON output"""
+    codes, names, levels = tree.codes, tree.names, tree.levels
+    first_child, next_sibling = tree.first_child, tree.next_sibling
+    
     result = {
-        'code': node['code'],
-        'name': node['name'],
-        'level': node['level']
+        'code': codes[index],
+        'name': names[index],
+        'level': levels[index]
     }
-    if node['children']:
-        result['children'] = [serialize_node(child) for child in sorted(node['children'].values(), key=lambda x: x['code'])]
+    stack = [(index, result)]
+    while stack:
+        index, dest = stack.pop()
+        child = first_child[index]
+        if child != -1:
+            children = []
+            while child != -1:
+                child_result = {
+                    'code': codes[child],
+                    'name': names[child],
+                    'level': levels[child]
+                }
+                children.append(child_result)
+                stack.append((child, child_result))
+                child = next_sibling[child]
+            dest['children'] = children
     return result
 
 
@@ -79,35 +146,34 @@ def main():
     print(f"Parsing XML file: {xml_file}", file=sys.stderr)
     
     try:
-        # Parse XML file
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
         # Find all sections and process their diag elements, preserving hierarchy
+        tree = DiagTree()
         hierarchy = {}
-        total_codes = 0
-        
-        def count_codes(node):
-            """Count total codes in a node and its children"""
-            count = 1
-            for child in node.get('children', {}).values():
-                count += count_codes(child)
-            return count
         
-        # Find all sections and process their diag elements
-        for section in root.findall('.//section'):
-            for diag in section.findall('diag'):
-                node = parse_diag_element(diag)
-                if node:
-                    hierarchy[node['code']] = node
-                    total_codes += count_codes(node)
+        # Stream the XML file; nested diags end before their parent, so a
+        # top-level diag is complete by the time its end event fires
+        for _, diag in etree.iterparse(xml_file, events=('end',), tag='diag'):
+            parent = diag.getparent()
+            if parent is None or parent.tag != 'section':
+                continue
+            
+            index = parse_diag_element(tree, diag)
+            if index is not None:
+                hierarchy[tree.codes[index]] = index
+            
+            # Free the processed subtree and everything before it
+            diag.clear()
+            while diag.getprevious() is not None:
+                del parent[0]
         
+        # Every parsed node is counted, including any later top-level duplicates
+        total_codes = len(tree)
         print(f"Found {total_codes} total codes", file=sys.stderr)
         print(f"Found {len(hierarchy)} top-level codes", file=sys.stderr)
         
         # Serialize to JSON format
         print("Serializing to JSON...", file=sys.stderr)
-        root_nodes = [serialize_node(node) for node in sorted(hierarchy.values(), key=lambda x: x['code'])]
+        root_nodes = [serialize_node(tree, hierarchy[code]) for code in sorted(hierarchy)]
         
         output = {
             'icd10cm': {
@@ -117,8 +183,12 @@ def main():
         
         # Write JSON file
         print(f"Writing JSON file: {json_file}", file=sys.stderr)
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
+        if HAS_ORJSON:
+            with open(json_file, 'wb') as f:
+                f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+        else:
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
         
         print(f"Successfully generated JSON with {len(root_nodes)} top-level codes", file=sys.stderr)
         print(f"Total codes: {total_codes}", file=sys.stderr)
@@ -5,117 +5,208 @@ by scraping each category page (A, B, C, E, G, H, J, K, L, M, P, Q, R, S, T, U,
 """
 import sys
 import time
-import re
-from typing import List, Dict
+import asyncio
+import json
+from collections import defaultdict
+from operator import itemgetter
+from typing import List, Dict, Optional, TextIO
 from pathlib import Path
+from urllib.parse import urlsplit
 
 try:
-    from playwright.sync_api import sync_playwright
+    from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
     HAS_PLAYWRIGHT = True
 except ImportError:
     HAS_PLAYWRIGHT = False
     print("Playwright not installed. Install with: pip install playwright")
     print("Then run: playwright install chromium")
 
+# Plain HTTP fast path for category pages that are served as static HTML
+try:
+    import requests
+    import lxml.html
+    HAS_STATIC = True
+except ImportError:
+    HAS_STATIC = False
+
 # All category letters
 CATEGORIES = ['A', 'B', 'C', 'E', 'G', 'H', 'J', 'K', 'L', 'M', 'P', 'Q', 'R', 'S', 'T', 'U', 'V']
 
+# Number of category pages scraped concurrently
+MAX_WORKERS = 4
+
+# Minimum time between requests to the same host, across all workers
+MIN_REQUEST_INTERVAL = 1.0
+
+CATEGORY_URL = "https://www.hcpcsdata.com/Codes/{}"
+
+# Finished category pages are appended here as JSON lines so an interrupted
+# run can pick up where it left off instead of keeping everything in memory
+PROGRESS_FILE = Path("src/data/hcpcs_codes.progress.jsonl")
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Buffer size for the TypeScript writer; the file is emitted one row at a time
+WRITE_BUFFER_SIZE = 1 << 20
+
+# JSON string syntax is valid in TypeScript, so the C JSON encoder does the
+# quoting and escaping of emitted strings
+_TS_STRING = json.JSONEncoder(ensure_ascii=False).encode
+
+# Line breaks flattened out of names
+_STRIP = str.maketrans({'\n': ' ', '\r': ''})
+
+# Sort key for code records
+_BY_CODE = itemgetter('code')
+
+# Level II HCPCS categories by leading letter. Category names are interned so
+# every code record shares a single string object per category.
+_CATEGORY_MAP = {
+    'A': "Medical and Surgical Supplies",
+    'B': "Enteral and Parenteral Therapy",
+    'C': "Temporary Codes",
+    'D': "Dental Procedures",
+    'E': "Durable Medical Equipment",
+    'G': "Temporary Procedures/Professional Services",
+    'H': "Alcohol and Drug Abuse Treatment Services",
+    'J': "Drugs Administered Other Than Oral Method",
+    'K': "Temporary Codes",
+    'L': "Orthotic and Prosthetic Procedures",
+    'M': "Medical Services",
+    'P': "Pathology and Laboratory Services",
+    'Q': "Temporary Codes",
+    'R': "Diagnostic Radiology Services",
+    'S': "Temporary National Codes",
+    'T': "Temporary Codes",
+    'U': "Clinical Laboratory Services",
+    'V': "Vision Services",
+}
+_CATEGORY_MAP = {prefix: sys.intern(name) for prefix, name in _CATEGORY_MAP.items()}
+
+# Level I CPT categories indexed by ten-thousands digit (10000-19999 -> 1, ..., 90000-99999 -> 9)
+_NUMERIC_CATS = [
+    None,
+    "Integumentary System",
+    "Musculoskeletal System",
+    "Respiratory System",
+    "Cardiovascular System",
+    "Digestive System",
+    "Urinary System",
+    "Nervous System",
+    "Pathology and Laboratory",
+    "Evaluation and Management",
+]
+_NUMERIC_CATS = [sys.intern(name) if name else None for name in _NUMERIC_CATS]
+
+_UNCATEGORIZED = sys.intern("Uncategorized")
+
 def categorize_code(code: str) -> str:
     """Categorize HCPCS code based on code pattern"""
     code_upper = code.upper().strip()
     
-    category_map = {
-        'A': "Medical and Surgical Supplies",
-        'B': "Enteral and Parenteral Therapy",
-        'C': "Temporary Codes",
-        'D': "Dental Procedures",
-        'E': "Durable Medical Equipment",
-        'G': "Temporary Procedures/Professional Services",
-        'H': "Alcohol and Drug Abuse Treatment Services",
-        'J': "Drugs Administered Other Than Oral Method",
-        'K': "Temporary Codes",
-        'L': "Orthotic and Prosthetic Procedures",
-        'M': "Medical Services",
-        'P': "Pathology and Laboratory Services",
-        'Q': "Temporary Codes",
-        'R': "Diagnostic Radiology Services",
-        'S': "Temporary National Codes",
-        'T': "Temporary Codes",
-        'U': "Clinical Laboratory Services",
-        'V': "Vision Services",
-    }
-    
-    if code_upper and code_upper[0] in category_map:
-        return category_map[code_upper[0]]
-    
-    # Numeric codes
-    numeric_part = re.sub(r'[^\d]', '', code_upper[:5])
+    category = _CATEGORY_MAP.get(code_upper[:1])
+    if category:
+        return category
+    
+    # Numeric codes: at most 5 digits, so the ten-thousands digit picks the range
+    numeric_part = code_upper[:5]
+    if not numeric_part.isdecimal():
+        numeric_part = ''.join(ch for ch in numeric_part if ch.isdecimal())
     if numeric_part:
-        num = int(numeric_part)
-        ranges = [
-            (10000, 19999, "Integumentary System"),
-            (20000, 29999, "Musculoskeletal System"),
-            (30000, 39999, "Respiratory System"),
-            (40000, 49999, "Cardiovascular System"),
-            (50000, 59999, "Digestive System"),
-            (60000, 69999, "Urinary System"),
-            (70000, 79999, "Nervous System"),
-            (80000, 89999, "Pathology and Laboratory"),
-            (90000, 99999, "Evaluation and Management"),
-        ]
-        for start, end, cat in ranges:
-            if start <= num <= end:
-                return cat
-    
-    return "Uncategorized"
-
-def scrape_category_page(page, category: str) -> List[Dict[str, str]]:
+        category = _NUMERIC_CATS[int(numeric_part) // 10000]
+        if category:
+            return category
+    
+    return _UNCATEGORIZED
+
+def extract_category_codes(table: List[List[str]]) -> List[Dict[str, str]]:
+    """Turn the cell text of a category page's table rows into codes"""
+    codes = []
+    
+    for i, cells in enumerate(table[1:], 1):  # Skip header
+        if len(cells) >= 2:
+            code = cells[0]
+            name = cells[1]
+            
+            # Skip empty rows or summary rows
+            if not code or not name:
+                continue
+            
+            # Skip rows that are clearly not codes (like "'X' Codes" summaries)
+            if code.startswith("'") and code.endswith(" Codes"):
+                continue
+            if code.isdigit() and len(code) > 4:  # Likely a count
+                continue
+            if len(code) < 2:  # Too short
+                continue
+            
+            # Determine category
+            category_name = categorize_code(code)
+            
+            codes.append({
+                'code': code,
+                'name': name,
+                'category': category_name
+            })
+            
+            if i % 50 == 0:
+                print(f"    Processed {i} rows, found {len(codes)} codes...")
+    
+    return codes
+
+def scrape_category_static(session, category: str) -> Optional[List[Dict[str, str]]]:
+    """Scrape a category page over plain HTTP, or return None if it needs a browser"""
+    url = CATEGORY_URL.format(category)
+    
+    try:
+        print(f"  Fetching {url}...")
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+        tree = lxml.html.fromstring(response.content)
+    except Exception as e:
+        print(f"  Static fetch failed for category {category}: {e}")
+        return None
+    
+    # Collapse whitespace the way the browser's innerText would
+    table = [[' '.join(cell.text_content().split()) for cell in row.xpath('.//td | .//th')]
+             for row in tree.xpath('//table//tr')]
+    codes = extract_category_codes(table)
+    if not codes:
+        # Table is filled in by JavaScript
+        return None
+    
+    print(f"  ✓ Extracted {len(codes)} codes from category {category}")
+    return codes
+
+async def scrape_category_page(page, category: str) -> List[Dict[str, str]]:
     """Scrape codes from a specific category page"""
-    url = f"https://www.hcpcsdata.com/Codes/{category}"
+    url = CATEGORY_URL.format(category)
     codes = []
     
     try:
         print(f"  Loading {url}...")
-        page.goto(url, wait_until="domcontentloaded", timeout=30000)
-        time.sleep(3)  # Wait for content to load
+        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
         
-        # Try to find table rows
-        rows = page.query_selector_all("table tr, tbody tr")
-        print(f"  Found {len(rows)} rows")
+        # Wait for table rows to be attached instead of sleeping a fixed time
+        try:
+            await page.wait_for_selector("table tbody tr", state="attached", timeout=15000)
+        except PlaywrightTimeout:
+            # Table may not use a tbody; poll briefly for any row before giving up
+            for _ in range(5):
+                if await page.query_selector("table tr"):
+                    break
+                await page.wait_for_timeout(500)
         
-        for i, row in enumerate(rows[1:], 1):  # Skip header
-            try:
-                cells = row.query_selector_all("td, th")
-                if len(cells) >= 2:
-                    code = cells[0].inner_text().strip()
-                    name = cells[1].inner_text().strip()
-                    
-                    # Skip empty rows or summary rows
-                    if not code or not name:
-                        continue
-                    
-                    # Skip rows that are clearly not codes (like "'X' Codes" summaries)
-                    if code.startswith("'") and code.endswith(" Codes"):
-                        continue
-                    if code.isdigit() and len(code) > 4:  # Likely a count
-                        continue
-                    if len(code) < 2:  # Too short
-                        continue
-                    
-                    # Determine category
-                    category_name = categorize_code(code)
-                    
-                    codes.append({
-                        'code': code,
-                        'name': name,
-                        'category': category_name
-                    })
-                    
-                    if i % 50 == 0:
-                        print(f"    Processed {i} rows, found {len(codes)} codes...")
-            except Exception as e:
-                continue
+        # Pull the whole table's cell text in a single round trip to the browser
+        table = await page.evaluate("""() => {
+            const rows = document.querySelectorAll('table tr, tbody tr');
+            return Array.from(rows).map(r =>
+                Array.from(r.querySelectorAll('td, th')).map(c => c.innerText.trim())
+            );
+        }""")
+        print(f"  Found {len(table)} rows")
         
+        codes = extract_category_codes(table)
         print(f"  ✓ Extracted {len(codes)} codes from category {category}")
         
     except Exception as e:
@@ -123,6 +214,12 @@ def scrape_category_page(page, category: str) -> List[Dict[str, str]]:
     
     return codes
 
+def name_literal(name: str) -> str:
+    """Quote a code name as a single-line TypeScript string literal"""
+    if '\n' in name or '\r' in name:
+        name = name.translate(_STRIP)
+    return _TS_STRING(name)
+
 def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/data/hcpcs_codes.ts"):
     """Generate TypeScript file from codes data"""
     
@@ -130,27 +227,21 @@ def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/dat
         print("No codes to generate!")
         return
     
-    # Remove duplicates
+    # Remove duplicates and group by category in one pass, keeping the first
+    # occurrence of each (code, name)
     seen = set()
-    unique_codes = []
+    categories = defaultdict(list)
     for code in codes:
         key = (code['code'], code['name'])
         if key not in seen:
             seen.add(key)
-            unique_codes.append(code)
-    
-    # Group by category for better organization
-    categories = {}
-    for code in unique_codes:
-        cat = code.get('category', 'Uncategorized')
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(code)
+            categories[code.get('category', 'Uncategorized')].append(code)
     
-    # Sort categories alphabetically
-    sorted_categories = sorted(categories.keys())
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    ts_content = """// HCPCS/CPT Codes from hcpcsdata.com
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("""// HCPCS/CPT Codes from hcpcsdata.com
 export interface HCPCSCode {
   code: string;
   name: string;
@@ -158,81 +249,190 @@ export interface HCPCSCode {
 }
 
 export const hcpcsCodes: HCPCSCode[] = [
-"""
+""")
+        
+        # Write codes grouped by category, with categories sorted alphabetically
+        for category, rows in sorted(categories.items(), key=itemgetter(0)):
+            f.write(f"\n  // {category}\n")
+            row_end = f', category: {_TS_STRING(category)} }},\n'
+            rows.sort(key=_BY_CODE)
+            f.write(''.join([
+                f'  {{ code: {_TS_STRING(code["code"])}, name: {name_literal(code["name"])}{row_end}'
+                for code in rows
+            ]))
+        
+        f.write("\n];\n")
     
-    # Write codes grouped by category
-    for category in sorted_categories:
-        ts_content += f"\n  // {category}\n"
-        for code in sorted(categories[category], key=lambda x: x['code']):
-            # Escape quotes and special characters in name
-            name = code['name'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ').replace('\r', '')
-            code_str = code['code'].replace('"', '\\"')
-            ts_content += f'  {{ code: "{code_str}", name: "{name}", category: "{category}" }},\n'
+    print(f"\n✓ Generated TypeScript file with {len(seen)} codes in {len(categories)} categories")
+    print(f"  Output: {output_path.absolute()}")
+
+def load_progress() -> Dict[str, List[Dict[str, str]]]:
+    """Read the category pages saved so far, keyed by category letter"""
+    done = {}
+    try:
+        text = PROGRESS_FILE.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return done
     
-    ts_content += "\n];\n"
+    # Split on '\n' only: names are saved with ensure_ascii=False, and
+    # splitlines() would also break lines at U+2028, U+2029 and U+0085
+    for line in text.split('\n'):
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # cut off by an interrupted write
+        codes = entry['codes']
+        # Share one string per category name with freshly scraped records
+        for code in codes:
+            code['category'] = sys.intern(code['category'])
+        done[entry['category']] = codes
     
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if text and not text.endswith('\n'):
+        # Finish the cut-off line so appended entries start on a line of their own
+        with open(PROGRESS_FILE, 'a', encoding='utf-8') as f:
+            f.write('\n')
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+    return done
+
+def saved_codes() -> List[Dict[str, str]]:
+    """All codes saved in the progress file"""
+    return [code for codes in load_progress().values() for code in codes]
+
+def save_category(log: TextIO, category: str, codes: List[Dict[str, str]]):
+    """Append a finished category page to the progress file"""
+    log.write(json.dumps({'category': category, 'codes': codes}, ensure_ascii=False) + '\n')
+    log.flush()
+    print(f"  Saved {len(codes)} codes for category {category}\n")
+
+class RequestPacer:
+    """Spaces out requests to each host by MIN_REQUEST_INTERVAL, shared by all workers"""
     
-    print(f"\n✓ Generated TypeScript file with {len(unique_codes)} codes in {len(categories)} categories")
-    print(f"  Output: {output_path.absolute()}")
+    def __init__(self):
+        self.last_request: Dict[str, float] = {}
+        self.locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+    
+    async def wait_turn(self, url: str):
+        """Sleep out whatever part of MIN_REQUEST_INTERVAL the host's last request didn't use"""
+        host = urlsplit(url).netloc
+        # Holding the lock through the sleep hands out one slot per interval
+        async with self.locks[host]:
+            delay = MIN_REQUEST_INTERVAL - (time.monotonic() - self.last_request.get(host, 0.0))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last_request[host] = time.monotonic()
 
-def main():
+async def scrape_static_worker(categories: List[str], log: TextIO, needs_browser: List[str],
+                               pacer: RequestPacer):
+    """Fetch a share of the category pages over HTTP, noting the ones that need a browser"""
+    with requests.Session() as session:
+        session.headers['User-Agent'] = USER_AGENT
+        for category in categories:
+            await pacer.wait_turn(CATEGORY_URL.format(category))
+            print(f"Fetching category {category}...")
+            category_codes = await asyncio.to_thread(scrape_category_static, session, category)
+            if category_codes:
+                save_category(log, category, category_codes)
+            else:
+                needs_browser.append(category)
+
+async def scrape_worker(context, categories: List[str], log: TextIO, pacer: RequestPacer):
+    """Scrape a share of the category pages on one page of the shared browser"""
+    page = await context.new_page()
+    try:
+        for category in categories:
+            await pacer.wait_turn(CATEGORY_URL.format(category))
+            print(f"Scraping category {category}...")
+            category_codes = await scrape_category_page(page, category)
+            # Empty pages are left out of the progress file so a rerun retries them
+            if category_codes:
+                save_category(log, category, category_codes)
+    finally:
+        await page.close()
+
+async def scrape_all(categories: List[str], log: TextIO):
+    """Scrape the given category pages, only starting a browser for JavaScript-rendered ones"""
+    if not categories:
+        return
+    
+    pacer = RequestPacer()
+    
+    if HAS_STATIC:
+        needs_browser = []
+        shares = [categories[i::MAX_WORKERS] for i in range(MAX_WORKERS)]
+        await asyncio.gather(*(scrape_static_worker(share, log, needs_browser, pacer) for share in shares if share))
+        if not needs_browser:
+            return
+        categories = [c for c in categories if c in needs_browser]
+        print(f"Rendering {len(categories)} categories in a browser: {', '.join(categories)}\n")
+    
     if not HAS_PLAYWRIGHT:
+        print("✗ Playwright is required to render the remaining categories")
+        return
+    
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=True,
+            args=['--disable-blink-features=AutomationControlled']
+        )
+        try:
+            context = await browser.new_context(
+                user_agent=USER_AGENT,
+                viewport={'width': 1920, 'height': 1080}
+            )
+            
+            # Deal categories round-robin across workers
+            shares = [categories[i::MAX_WORKERS] for i in range(MAX_WORKERS)]
+            await asyncio.gather(*(scrape_worker(context, share, log, pacer) for share in shares if share))
+        finally:
+            await browser.close()
+
+def main():
+    if not HAS_PLAYWRIGHT and not HAS_STATIC:
         print("ERROR: Playwright is required.")
         print("Install with: pip install playwright && playwright install chromium")
         sys.exit(1)
     
     print("HCPCS Codes Scraper - Category Pages")
     print("=" * 50)
-    print(f"Scraping {len(CATEGORIES)} category pages...\n")
     
-    all_codes = []
+    done = load_progress()
+    pending = [c for c in CATEGORIES if c not in done]
+    if done:
+        print(f"Resuming: {len(done)} categories already saved in {PROGRESS_FILE}")
+    print(f"Scraping {len(pending)} category pages with {MAX_WORKERS} workers...\n")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=['--disable-blink-features=AutomationControlled']
-        )
-        context = browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080}
-        )
-        page = context.new_page()
+    PROGRESS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        with open(PROGRESS_FILE, 'a', encoding='utf-8') as log:
+            asyncio.run(scrape_all(pending, log))
         
-        try:
-            for i, category in enumerate(CATEGORIES, 1):
-                print(f"[{i}/{len(CATEGORIES)}] Scraping category {category}...")
-                category_codes = scrape_category_page(page, category)
-                all_codes.extend(category_codes)
-                print(f"  Total codes so far: {len(all_codes)}\n")
-                
-                # Small delay between requests
-                time.sleep(1)
+        all_codes = saved_codes()
+        if all_codes:
+            print(f"\n✓ Successfully scraped {len(all_codes)} total codes")
+            generate_typescript(all_codes)
+            PROGRESS_FILE.unlink()
+        else:
+            print("\n✗ No codes found")
             
-            if all_codes:
-                print(f"\n✓ Successfully scraped {len(all_codes)} total codes")
-                generate_typescript(all_codes)
-            else:
-                print("\n✗ No codes found")
-                
-        except KeyboardInterrupt:
-            print("\n\nScraping interrupted by user")
-            if all_codes:
-                print(f"Saving {len(all_codes)} codes found so far...")
-                generate_typescript(all_codes)
-        except Exception as e:
-            print(f"\n✗ Error: {e}")
-            import traceback
-            traceback.print_exc()
-            if all_codes:
-                print(f"\nSaving {len(all_codes)} codes found before error...")
-                generate_typescript(all_codes)
-        finally:
-            browser.close()
+    except KeyboardInterrupt:
+        print("\n\nScraping interrupted by user")
+        codes_so_far = saved_codes()
+        if codes_so_far:
+            print(f"Saving {len(codes_so_far)} codes found so far...")
+            generate_typescript(codes_so_far)
+        print(f"Progress kept in {PROGRESS_FILE}; run again to resume")
+    except Exception as e:
+        print(f"\n✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        codes_so_far = saved_codes()
+        if codes_so_far:
+            print(f"\nSaving {len(codes_so_far)} codes found before error...")
+            generate_typescript(codes_so_far)
+        print(f"Progress kept in {PROGRESS_FILE}; run again to resume")
     
     print("\nDone!")
 
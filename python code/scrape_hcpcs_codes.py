@@ -9,6 +9,10 @@ import sys
 import time
 import json
 import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict, Optional
 from pathlib import Path
 
@@ -25,6 +29,79 @@ except ImportError:
     print("Selenium not installed. Install with: pip install selenium")
     print("Also install ChromeDriver: brew install chromedriver (on macOS)")
 
+# Buffer size for the TypeScript writer; the file is emitted one row at a time
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Reads the text of the first three cells of every row of the table passed
+# as the first argument in one script call instead of one per cell
+_TABLE_CELLS_JS = """
+    return Array.from(arguments[0].querySelectorAll('tr'),
+        row => Array.from(row.querySelectorAll('td')).slice(0, 3).map(cell => cell.innerText));
+"""
+
+# JSON string syntax is valid in TypeScript, so the C JSON encoder does the
+# quoting and escaping of emitted strings
+_TS_STRING = json.JSONEncoder(ensure_ascii=False).encode
+
+# Line breaks flattened out of names
+_STRIP = str.maketrans({'\n': ' ', '\r': ''})
+
+# Sort key for code records
+_BY_CODE = itemgetter('code')
+
+# Level II HCPCS categories by leading letter
+_CATEGORY_MAP = {
+    'A': "Medical and Surgical Supplies",
+    'B': "Enteral and Parenteral Therapy",
+    'C': "Temporary Codes",
+    'D': "Dental Procedures",
+    'E': "Durable Medical Equipment",
+    'G': "Temporary Procedures/Professional Services",
+    'H': "Alcohol and Drug Abuse Treatment Services",
+    'J': "Drugs Administered Other Than Oral Method",
+    'K': "Temporary Codes",
+    'L': "Orthotic and Prosthetic Procedures",
+    'M': "Medical Services",
+    'P': "Pathology and Laboratory Services",
+    'Q': "Temporary Codes",
+    'R': "Diagnostic Radiology Services",
+    'S': "Temporary National Codes",
+    'T': "Temporary Codes",
+    'U': "Clinical Laboratory Services",
+    'V': "Vision Services",
+}
+
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Level I CPT categories by the inclusive upper bound of their numeric range,
+# looked up with bisect. Codes below 10000 fall in the leading empty range.
+_CPT_RANGES = [
+    (9999, None),
+    (19999, "Integumentary System"),
+    (29999, "Musculoskeletal System"),
+    (39999, "Respiratory System"),
+    (49999, "Cardiovascular System"),
+    (59999, "Digestive System"),
+    (69999, "Urinary System"),
+    (79999, "Nervous System"),
+    (89999, "Pathology and Laboratory"),
+    (99999, "Evaluation and Management"),
+    (199999, "Anesthesia"),
+    (299999, "Radiology"),
+    (399999, "Medicine"),
+    (499999, "Surgery"),
+    (599999, "Physical Medicine"),
+    (699999, "Emergency Medicine"),
+    (799999, "Critical Care"),
+    (899999, "Preventive Medicine"),
+    (999999, "Psychiatry"),
+]
+_CPT_UPPER_BOUNDS = [upper for upper, _ in _CPT_RANGES]
+_CPT_CATEGORIES = [category for _, category in _CPT_RANGES]
+
+# The table scrape and the pagination fallback re-read the same rows, so the
+# same codes get categorized more than once per run
+@lru_cache(maxsize=65536)
 def categorize_code(code: str) -> str:
     """
     Categorize HCPCS code based on code pattern
@@ -32,86 +109,22 @@ def categorize_code(code: str) -> str:
     code_upper = code.upper().strip()
     
     # Level II HCPCS codes (A-V codes)
-    if code_upper.startswith('A'):
-        return "Medical and Surgical Supplies"
-    elif code_upper.startswith('B'):
-        return "Enteral and Parenteral Therapy"
-    elif code_upper.startswith('C'):
-        return "Temporary Codes"
-    elif code_upper.startswith('D'):
-        return "Dental Procedures"
-    elif code_upper.startswith('E'):
-        return "Durable Medical Equipment"
-    elif code_upper.startswith('G'):
-        return "Temporary Procedures/Professional Services"
-    elif code_upper.startswith('H'):
-        return "Alcohol and Drug Abuse Treatment Services"
-    elif code_upper.startswith('J'):
-        return "Drugs Administered Other Than Oral Method"
-    elif code_upper.startswith('K'):
-        return "Temporary Codes"
-    elif code_upper.startswith('L'):
-        return "Orthotic and Prosthetic Procedures"
-    elif code_upper.startswith('M'):
-        return "Medical Services"
-    elif code_upper.startswith('P'):
-        return "Pathology and Laboratory Services"
-    elif code_upper.startswith('Q'):
-        return "Temporary Codes"
-    elif code_upper.startswith('R'):
-        return "Diagnostic Radiology Services"
-    elif code_upper.startswith('S'):
-        return "Temporary National Codes"
-    elif code_upper.startswith('T'):
-        return "Temporary Codes"
-    elif code_upper.startswith('U'):
-        return "Clinical Laboratory Services"
-    elif code_upper.startswith('V'):
-        return "Vision Services"
+    category = _CATEGORY_MAP.get(code_upper[:1])
+    if category:
+        return category
     
     # Level I CPT codes (numeric)
     if code_upper.replace('.', '').isdigit() or (len(code_upper) >= 1 and code_upper[0].isdigit()):
         # Extract numeric part
-        numeric_part = re.sub(r'[^\d]', '', code_upper[:5])
+        numeric_part = code_upper[:5]
+        if not numeric_part.isdecimal():
+            numeric_part = _NON_DIGIT_RE.sub('', numeric_part)
         if numeric_part:
             num = int(numeric_part)
             
-            if 10000 <= num <= 19999:
-                return "Integumentary System"
-            elif 20000 <= num <= 29999:
-                return "Musculoskeletal System"
-            elif 30000 <= num <= 39999:
-                return "Respiratory System"
-            elif 40000 <= num <= 49999:
-                return "Cardiovascular System"
-            elif 50000 <= num <= 59999:
-                return "Digestive System"
-            elif 60000 <= num <= 69999:
-                return "Urinary System"
-            elif 70000 <= num <= 79999:
-                return "Nervous System"
-            elif 80000 <= num <= 89999:
-                return "Pathology and Laboratory"
-            elif 90000 <= num <= 99999:
-                return "Evaluation and Management"
-            elif 100000 <= num <= 199999:
-                return "Anesthesia"
-            elif 200000 <= num <= 299999:
-                return "Radiology"
-            elif 300000 <= num <= 399999:
-                return "Medicine"
-            elif 400000 <= num <= 499999:
-                return "Surgery"
-            elif 500000 <= num <= 599999:
-                return "Physical Medicine"
-            elif 600000 <= num <= 699999:
-                return "Emergency Medicine"
-            elif 700000 <= num <= 799999:
-                return "Critical Care"
-            elif 800000 <= num <= 899999:
-                return "Preventive Medicine"
-            elif 900000 <= num <= 999999:
-                return "Psychiatry"
+            index = bisect_left(_CPT_UPPER_BOUNDS, num)
+            if index < len(_CPT_CATEGORIES) and _CPT_CATEGORIES[index]:
+                return _CPT_CATEGORIES[index]
     
     return "Uncategorized"
 
@@ -146,32 +159,27 @@ def scrape_codes_from_table(driver) -> List[Dict[str, str]]:
         table = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
         
         # Get all rows
-        rows = table.find_elements(By.TAG_NAME, "tr")
+        rows = driver.execute_script(_TABLE_CELLS_JS, table)
         print(f"Found {len(rows)} rows in table")
         
-        for i, row in enumerate(rows[1:], 1):  # Skip header
-            try:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) >= 2:
-                    code = cells[0].text.strip()
-                    name = cells[1].text.strip()
-                    category = cells[2].text.strip() if len(cells) > 2 else None
+        for i, cells in enumerate(rows[1:], 1):  # Skip header
+            if len(cells) >= 2:
+                code = cells[0].strip()
+                name = cells[1].strip()
+                category = cells[2].strip() if len(cells) > 2 else None
+                
+                if code and name:
+                    if not category:
+                        category = categorize_code(code)
                     
-                    if code and name:
-                        if not category:
-                            category = categorize_code(code)
-                        
-                        codes.append({
-                            'code': code,
-                            'name': name,
-                            'category': category
-                        })
-                        
-                        if i % 100 == 0:
-                            print(f"  Scraped {i} codes...")
-            except Exception as e:
-                print(f"  Error processing row {i}: {e}")
-                continue
+                    codes.append({
+                        'code': code,
+                        'name': name,
+                        'category': category
+                    })
+                    
+                    if i % 100 == 0:
+                        print(f"  Scraped {i} codes...")
                 
     except TimeoutException:
         print("Timeout waiting for table to load")
@@ -224,15 +232,42 @@ def scrape_codes_from_api(driver) -> Optional[List[Dict[str, str]]]:
     
     return None
 
+# Key spellings used for each field by the JSON feeds, in order of preference
+_CODE_KEYS = ('code', 'Code', 'HCPCS', 'hcpcs', 'HcpcsCode')
+_NAME_KEYS = ('name', 'Name', 'Description', 'description', 'LongDescription')
+_CATEGORY_KEYS = ('category', 'Category', 'Type', 'type', 'CategoryName')
+
+def _resolve_key(sample: Dict, keys: tuple) -> str:
+    """Pick the first of keys that the sample item uses"""
+    return next((key for key in keys if key in sample), keys[0])
+
+def _first_value(item: Dict, keys: tuple):
+    """Return the first non-empty value under any of keys"""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return None
+
 def process_json_data(data: List[Dict]) -> List[Dict[str, str]]:
     """Process JSON data into standardized format"""
     codes = []
     
+    sample = next((item for item in data if isinstance(item, dict)), None)
+    if sample is None:
+        return codes
+    
+    # A feed spells its keys the same way on every item, so resolve them once
+    # and only probe the other spellings when an item lacks a value
+    code_key = _resolve_key(sample, _CODE_KEYS)
+    name_key = _resolve_key(sample, _NAME_KEYS)
+    category_key = _resolve_key(sample, _CATEGORY_KEYS)
+    
     for item in data:
         if isinstance(item, dict):
-            code = item.get('code') or item.get('Code') or item.get('HCPCS') or item.get('hcpcs') or item.get('HcpcsCode')
-            name = item.get('name') or item.get('Name') or item.get('Description') or item.get('description') or item.get('LongDescription')
-            category = item.get('category') or item.get('Category') or item.get('Type') or item.get('type') or item.get('CategoryName')
+            code = item.get(code_key) or _first_value(item, _CODE_KEYS)
+            name = item.get(name_key) or _first_value(item, _NAME_KEYS)
+            category = item.get(category_key) or _first_value(item, _CATEGORY_KEYS)
             
             if code and name:
                 if not category:
@@ -260,28 +295,24 @@ def scrape_with_pagination(driver) -> List[Dict[str, str]]:
             table = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
             
             # Scrape current page
-            rows = table.find_elements(By.TAG_NAME, "tr")
+            rows = driver.execute_script(_TABLE_CELLS_JS, table)
             page_codes = []
             
-            for row in rows[1:]:  # Skip header
-                try:
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                    if len(cells) >= 2:
-                        code = cells[0].text.strip()
-                        name = cells[1].text.strip()
-                        category = cells[2].text.strip() if len(cells) > 2 else None
+            for cells in rows[1:]:  # Skip header
+                if len(cells) >= 2:
+                    code = cells[0].strip()
+                    name = cells[1].strip()
+                    category = cells[2].strip() if len(cells) > 2 else None
+                    
+                    if code and name:
+                        if not category:
+                            category = categorize_code(code)
                         
-                        if code and name:
-                            if not category:
-                                category = categorize_code(code)
-                            
-                            page_codes.append({
-                                'code': code,
-                                'name': name,
-                                'category': category
-                            })
-                except:
-                    continue
+                        page_codes.append({
+                            'code': code,
+                            'name': name,
+                            'category': category
+                        })
             
             codes.extend(page_codes)
             print(f"  Found {len(page_codes)} codes on page {page} (total: {len(codes)})")
@@ -311,6 +342,12 @@ def scrape_with_pagination(driver) -> List[Dict[str, str]]:
     
     return codes
 
+def name_literal(name: str) -> str:
+    """Quote a code name as a single-line TypeScript string literal"""
+    if '\n' in name or '\r' in name:
+        name = name.translate(_STRIP)
+    return _TS_STRING(name)
+
 def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/data/hcpcs_codes.ts"):
     """Generate TypeScript file from codes data"""
     
@@ -319,17 +356,16 @@ def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/dat
         return
     
     # Group codes by category for better organization
-    categories = {}
+    categories = defaultdict(list)
     for code in codes:
-        cat = code.get('category', 'Uncategorized')
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(code)
+        categories[code.get('category', 'Uncategorized')].append(code)
     
-    # Sort categories alphabetically
-    sorted_categories = sorted(categories.keys())
+    # Write to file
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    ts_content = """// HCPCS/CPT Codes from hcpcsdata.com
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("""// HCPCS/CPT Codes from hcpcsdata.com
 export interface HCPCSCode {
   code: string;
   name: string;
@@ -337,25 +373,19 @@ export interface HCPCSCode {
 }
 
 export const hcpcsCodes: HCPCSCode[] = [
-"""
-    
-    # Write codes grouped by category
-    for category in sorted_categories:
-        ts_content += f"\n  // {category}\n"
-        for code in sorted(categories[category], key=lambda x: x['code']):
-            # Escape quotes and backslashes in name
-            name = code['name'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ').replace('\r', '')
-            code_str = code['code'].replace('"', '\\"')
-            ts_content += f'  {{ code: "{code_str}", name: "{name}", category: "{category}" }},\n'
-    
-    ts_content += "\n];\n"
-    
-    # Write to file
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+""")
+        
+        # Write codes grouped by category, with categories sorted alphabetically
+        for category, rows in sorted(categories.items(), key=itemgetter(0)):
+            f.write(f"\n  // {category}\n")
+            row_end = f', category: {_TS_STRING(category)} }},\n'
+            rows.sort(key=_BY_CODE)
+            f.write(''.join([
+                f'  {{ code: {_TS_STRING(code["code"])}, name: {name_literal(code["name"])}{row_end}'
+                for code in rows
+            ]))
+        
+        f.write("\n];\n")
     
     print(f"\n✓ Generated TypeScript file with {len(codes)} codes in {len(categories)} categories")
     print(f"  Output: {output_path.absolute()}")
@@ -6,7 +6,9 @@ This script tries multiple methods to extract all codes.
 import sys
 import json
 import re
-import time
+from bisect import bisect_left
+from collections import defaultdict
+from operator import itemgetter
 from typing import List, Dict
 from pathlib import Path
 
@@ -18,52 +20,86 @@ except ImportError:
     print("Playwright not installed. Install with: pip install playwright")
     print("Then run: playwright install chromium")
 
+# Buffer size for the TypeScript writer; the file is emitted one category at a time
+WRITE_BUFFER_SIZE = 1 << 20
+
+# JSON string syntax is valid in TypeScript, so the C JSON encoder does the
+# quoting and escaping of emitted strings
+_TS_STRING = json.JSONEncoder(ensure_ascii=False).encode
+
+# Line breaks flattened out of names
+_STRIP = str.maketrans({'\n': ' ', '\r': ''})
+
+# Collects the text of the first three cells of every matching row in a
+# single round-trip instead of querying each row and cell from Python
+_ROW_CELLS_JS = """
+    ([rowSelector, cellSelector]) => Array.from(
+        document.querySelectorAll(rowSelector),
+        row => Array.from(row.querySelectorAll(cellSelector)).slice(0, 3).map(cell => cell.innerText)
+    )
+"""
+
+# Level II HCPCS categories by leading letter
+_CATEGORY_MAP = {
+    'A': "Medical and Surgical Supplies",
+    'B': "Enteral and Parenteral Therapy",
+    'C': "Temporary Codes",
+    'D': "Dental Procedures",
+    'E': "Durable Medical Equipment",
+    'G': "Temporary Procedures/Professional Services",
+    'H': "Alcohol and Drug Abuse Treatment Services",
+    'J': "Drugs Administered Other Than Oral Method",
+    'K': "Temporary Codes",
+    'L': "Orthotic and Prosthetic Procedures",
+    'M': "Medical Services",
+    'P': "Pathology and Laboratory Services",
+    'Q': "Temporary Codes",
+    'R': "Diagnostic Radiology Services",
+    'S': "Temporary National Codes",
+    'T': "Temporary Codes",
+    'U': "Clinical Laboratory Services",
+    'V': "Vision Services",
+}
+
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Level I CPT categories by the inclusive upper bound of their numeric range,
+# looked up with bisect. Codes below 10000 fall in the leading empty range.
+_CPT_RANGES = [
+    (9999, None),
+    (19999, "Integumentary System"),
+    (29999, "Musculoskeletal System"),
+    (39999, "Respiratory System"),
+    (49999, "Cardiovascular System"),
+    (59999, "Digestive System"),
+    (69999, "Urinary System"),
+    (79999, "Nervous System"),
+    (89999, "Pathology and Laboratory"),
+    (99999, "Evaluation and Management"),
+]
+_CPT_UPPER_BOUNDS = [upper for upper, _ in _CPT_RANGES]
+_CPT_CATEGORIES = [category for _, category in _CPT_RANGES]
+
+# Sort key for code records
+_BY_CODE = itemgetter('code')
+
 def categorize_code(code: str) -> str:
     """Categorize HCPCS code based on code pattern"""
     code_upper = code.upper().strip()
     
-    category_map = {
-        'A': "Medical and Surgical Supplies",
-        'B': "Enteral and Parenteral Therapy",
-        'C': "Temporary Codes",
-        'D': "Dental Procedures",
-        'E': "Durable Medical Equipment",
-        'G': "Temporary Procedures/Professional Services",
-        'H': "Alcohol and Drug Abuse Treatment Services",
-        'J': "Drugs Administered Other Than Oral Method",
-        'K': "Temporary Codes",
-        'L': "Orthotic and Prosthetic Procedures",
-        'M': "Medical Services",
-        'P': "Pathology and Laboratory Services",
-        'Q': "Temporary Codes",
-        'R': "Diagnostic Radiology Services",
-        'S': "Temporary National Codes",
-        'T': "Temporary Codes",
-        'U': "Clinical Laboratory Services",
-        'V': "Vision Services",
-    }
-    
-    if code_upper and code_upper[0] in category_map:
-        return category_map[code_upper[0]]
+    category = _CATEGORY_MAP.get(code_upper[:1])
+    if category:
+        return category
     
     # Numeric codes
-    numeric_part = re.sub(r'[^\d]', '', code_upper[:5])
+    numeric_part = code_upper[:5]
+    if not numeric_part.isdecimal():
+        numeric_part = _NON_DIGIT_RE.sub('', numeric_part)
     if numeric_part:
         num = int(numeric_part)
-        ranges = [
-            (10000, 19999, "Integumentary System"),
-            (20000, 29999, "Musculoskeletal System"),
-            (30000, 39999, "Respiratory System"),
-            (40000, 49999, "Cardiovascular System"),
-            (50000, 59999, "Digestive System"),
-            (60000, 69999, "Urinary System"),
-            (70000, 79999, "Nervous System"),
-            (80000, 89999, "Pathology and Laboratory"),
-            (90000, 99999, "Evaluation and Management"),
-        ]
-        for start, end, cat in ranges:
-            if start <= num <= end:
-                return cat
+        index = bisect_left(_CPT_UPPER_BOUNDS, num)
+        if index < len(_CPT_CATEGORIES) and _CPT_CATEGORIES[index]:
+            return _CPT_CATEGORIES[index]
     
     return "Uncategorized"
 
@@ -75,41 +111,41 @@ def extract_all_codes(page) -> List[Dict[str, str]]:
     try:
         # Wait for table
         page.wait_for_selector("table", timeout=15000)
-        time.sleep(3)  # Extra wait for data to populate
+        try:
+            # Give the data a moment to populate, but stop as soon as rows show up
+            page.wait_for_selector("table tr:nth-child(10)", state="attached", timeout=3000)
+        except PlaywrightTimeout:
+            pass
         
         # Try to find all rows
-        rows = page.query_selector_all("table tr, tbody tr, [role='row']")
+        rows = page.evaluate(_ROW_CELLS_JS, ["table tr, tbody tr, [role='row']", "td, th"])
         print(f"  Found {len(rows)} rows")
         
-        for i, row in enumerate(rows[1:], 1):  # Skip header
-            try:
-                cells = row.query_selector_all("td, th")
-                if len(cells) >= 2:
-                    code = cells[0].inner_text().strip()
-                    name = cells[1].inner_text().strip()
-                    
-                    # Skip summary rows (rows that contain "'X' Codes" or just numbers)
-                    if code.startswith("'") and code.endswith(" Codes"):
-                        continue
-                    if code.isdigit() and len(code) > 3:  # Likely a count, not a code
-                        continue
-                    if not code or len(code) < 2:  # Too short to be a valid code
-                        continue
+        for cells in rows[1:]:  # Skip header
+            if len(cells) >= 2:
+                code = cells[0].strip()
+                name = cells[1].strip()
+                
+                # Skip summary rows (rows that contain "'X' Codes" or just numbers)
+                if code.startswith("'") and code.endswith(" Codes"):
+                    continue
+                if code.isdigit() and len(code) > 3:  # Likely a count, not a code
+                    continue
+                if not code or len(code) < 2:  # Too short to be a valid code
+                    continue
+                
+                # Valid HCPCS codes are typically 5 characters (alphanumeric)
+                # or start with a letter followed by numbers
+                if code and name and len(code) >= 2:
+                    category = cells[2].strip() if len(cells) > 2 else None
+                    if not category:
+                        category = categorize_code(code)
                     
-                    # Valid HCPCS codes are typically 5 characters (alphanumeric)
-                    # or start with a letter followed by numbers
-                    if code and name and len(code) >= 2:
-                        category = cells[2].inner_text().strip() if len(cells) > 2 else None
-                        if not category:
-                            category = categorize_code(code)
-                        
-                        codes.append({
-                            'code': code,
-                            'name': name,
-                            'category': category
-                        })
-            except:
-                continue
+                    codes.append({
+                        'code': code,
+                        'name': name,
+                        'category': category
+                    })
         
         print(f"  Extracted {len(codes)} codes from table")
     except Exception as e:
@@ -179,28 +215,31 @@ def extract_all_codes(page) -> List[Dict[str, str]]:
             last_count = len(codes)
             for scroll in range(20):  # Max 20 scrolls
                 page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(2)
+                try:
+                    # Wait for the scroll to load more rows rather than a fixed delay
+                    page.wait_for_function(
+                        "n => document.querySelectorAll('table tr, tbody tr').length > n",
+                        arg=len(rows), timeout=2000
+                    )
+                except PlaywrightTimeout:
+                    pass
                 
                 # Re-extract
-                new_rows = page.query_selector_all("table tr, tbody tr")
+                new_rows = page.evaluate(_ROW_CELLS_JS, ["table tr, tbody tr", "td"])
                 if len(new_rows) > len(rows):
                     rows = new_rows
                     # Re-extract codes
                     new_codes = []
-                    for row in rows[1:]:
-                        try:
-                            cells = row.query_selector_all("td")
-                            if len(cells) >= 2:
-                                code = cells[0].inner_text().strip()
-                                name = cells[1].inner_text().strip()
-                                if code and name:
-                                    new_codes.append({
-                                        'code': code,
-                                        'name': name,
-                                        'category': categorize_code(code)
-                                    })
-                        except:
-                            continue
+                    for cells in rows[1:]:
+                        if len(cells) >= 2:
+                            code = cells[0].strip()
+                            name = cells[1].strip()
+                            if code and name:
+                                new_codes.append({
+                                    'code': code,
+                                    'name': name,
+                                    'category': categorize_code(code)
+                                })
                     
                     codes = new_codes
                     if len(codes) == last_count:
@@ -212,32 +251,34 @@ def extract_all_codes(page) -> List[Dict[str, str]]:
     
     return codes
 
+def name_literal(name: str) -> str:
+    """Quote a code name as a single-line TypeScript string literal"""
+    if '\n' in name or '\r' in name:
+        name = name.translate(_STRIP)
+    return _TS_STRING(name)
+
 def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/data/hcpcs_codes.ts"):
     """Generate TypeScript file"""
     if not codes:
         print("No codes to generate!")
         return
     
-    # Remove duplicates
+    # Remove duplicates and group by category in one pass, keeping the first
+    # occurrence of each (code, name)
     seen = set()
-    unique_codes = []
+    categories = defaultdict(list)
     for code in codes:
         key = (code['code'], code['name'])
         if key not in seen:
             seen.add(key)
-            unique_codes.append(code)
+            categories[code.get('category', 'Uncategorized')].append(code)
     
-    # Group by category
-    categories = {}
-    for code in unique_codes:
-        cat = code.get('category', 'Uncategorized')
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(code)
-    
-    sorted_categories = sorted(categories.keys())
+    # Write to file
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    ts_content = """// HCPCS/CPT Codes from hcpcsdata.com
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("""// HCPCS/CPT Codes from hcpcsdata.com
 export interface HCPCSCode {
   code: string;
   name: string;
@@ -245,24 +286,21 @@ export interface HCPCSCode {
 }
 
 export const hcpcsCodes: HCPCSCode[] = [
-"""
-    
-    for category in sorted_categories:
-        ts_content += f"\n  // {category}\n"
-        for code in sorted(categories[category], key=lambda x: x['code']):
-            name = code['name'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ').replace('\r', '')
-            code_str = code['code'].replace('"', '\\"')
-            ts_content += f'  {{ code: "{code_str}", name: "{name}", category: "{category}" }},\n'
-    
-    ts_content += "\n];\n"
-    
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+""")
+        
+        # Write codes grouped by category, with categories sorted alphabetically
+        for category, rows in sorted(categories.items(), key=itemgetter(0)):
+            f.write(f"\n  // {category}\n")
+            row_end = f', category: {_TS_STRING(category)} }},\n'
+            rows.sort(key=_BY_CODE)
+            f.write(''.join([
+                f'  {{ code: {_TS_STRING(code["code"])}, name: {name_literal(code["name"])}{row_end}'
+                for code in rows
+            ]))
+        
+        f.write("\n];\n")
     
-    print(f"\n✓ Generated TypeScript file with {len(unique_codes)} codes in {len(categories)} categories")
+    print(f"\n✓ Generated TypeScript file with {len(seen)} codes in {len(categories)} categories")
     print(f"  Output: {output_path.absolute()}")
 
 def main():
@@ -290,17 +328,24 @@ def main():
             page.goto("https://www.hcpcsdata.com/Codes", wait_until="domcontentloaded", timeout=30000)
             
             print("Waiting for content to load...")
-            time.sleep(10)  # Wait for dynamic content
+            try:
+                page.wait_for_load_state("networkidle", timeout=10000)
+            except PlaywrightTimeout:
+                pass
             
             # Try to click any "show all" buttons
             try:
-                buttons = page.query_selector_all("button, a, [role='button']")
-                for btn in buttons[:20]:  # Check first 20 buttons
-                    text = btn.inner_text().lower()
+                # Read every button label in one call rather than one per button
+                buttons = page.locator("button, a, [role='button']")
+                for i, label in enumerate(buttons.all_inner_texts()[:20]):  # Check first 20 buttons
+                    text = label.lower()
                     if any(word in text for word in ['all', 'show', 'load', 'view all', 'display all']):
-                        print(f"Clicking: {btn.inner_text()}")
-                        btn.click()
-                        time.sleep(5)
+                        print(f"Clicking: {label}")
+                        buttons.nth(i).click()
+                        try:
+                            page.wait_for_load_state("networkidle", timeout=5000)
+                        except PlaywrightTimeout:
+                            pass
                         break
             except:
                 pass
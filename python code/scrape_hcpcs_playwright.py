@@ -6,82 +6,172 @@ Playwright is easier to install than Selenium and handles dynamic content better
 import sys
 import json
 import re
+import time
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict
 from pathlib import Path
 
 try:
-    from playwright.sync_api import sync_playwright
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
     HAS_PLAYWRIGHT = True
 except ImportError:
     HAS_PLAYWRIGHT = False
     print("Playwright not installed. Install with: pip install playwright")
     print("Then run: playwright install chromium")
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# An API response with more items than this is taken as the full code list
+API_MIN_ITEMS = 5000
+
+# JSON responses with a declared body smaller than this can't hold a code
+# list worth keeping. The header gives the encoded size, so this stays well
+# below what even a gzipped list of 100 records takes.
+MIN_JSON_BYTES = 512
+
+# Seconds to wait for the code list API or the table after the page loads
+CONTENT_WAIT_TIMEOUT = 8.0
+
+# Text of the inline scripts that could hold a var x = [...] assignment,
+# filtered in the browser so only candidates cross over
+_ARRAY_SCRIPTS_JS = """
+    () => Array.from(document.scripts, script => script.textContent)
+        .filter(text => text && text.includes('var') && text.includes('['))
+"""
+
+# Resource types the scraper never reads. Stylesheets still load, since
+# innerText and the scroll-to-load paging depend on the page's layout
+_BLOCKED_RESOURCES = frozenset({'image', 'font', 'media'})
+
+# A table with more rows than this already holds the full list, so there is
+# nothing left to load by scrolling
+FULL_TABLE_ROWS = 5000
+
+# Page height and table row count, read together for the scroll loop
+_PAGE_SIZE_JS = "() => [document.body.scrollHeight, document.querySelectorAll('table tr').length]"
+
+# Matches once the table has been filled in
+_TABLE_FILLED = "table tr:nth-child(50), tbody tr:nth-child(50)"
+
+# Counts the rows matched by each selector and returns the first three cell
+# texts of every row of the best one, all in a single round-trip
+_TABLE_ROWS_JS = """
+    (selectors) => {
+        let best = null, bestCount = 0;
+        const counts = selectors.map(selector => {
+            const count = document.querySelectorAll(selector).length;
+            if (count > bestCount) {
+                best = selector;
+                bestCount = count;
+            }
+            return count;
+        });
+        const rows = best ? Array.from(
+            document.querySelectorAll(best),
+            row => Array.from(row.querySelectorAll('td')).slice(0, 3).map(cell => cell.innerText)
+        ) : [];
+        return [counts, rows];
+    }
+"""
+
+# Level II HCPCS categories by leading letter
+_CATEGORY_MAP = {
+    'A': "Medical and Surgical Supplies",
+    'B': "Enteral and Parenteral Therapy",
+    'C': "Temporary Codes",
+    'D': "Dental Procedures",
+    'E': "Durable Medical Equipment",
+    'G': "Temporary Procedures/Professional Services",
+    'H': "Alcohol and Drug Abuse Treatment Services",
+    'J': "Drugs Administered Other Than Oral Method",
+    'K': "Temporary Codes",
+    'L': "Orthotic and Prosthetic Procedures",
+    'M': "Medical Services",
+    'P': "Pathology and Laboratory Services",
+    'Q': "Temporary Codes",
+    'R': "Diagnostic Radiology Services",
+    'S': "Temporary National Codes",
+    'T': "Temporary Codes",
+    'U': "Clinical Laboratory Services",
+    'V': "Vision Services",
+}
+
+# Level I CPT categories indexed by ten-thousands digit (10000-19999 -> 1, ..., 90000-99999 -> 9)
+_NUMERIC_CATS = [
+    None,
+    "Integumentary System",
+    "Musculoskeletal System",
+    "Respiratory System",
+    "Cardiovascular System",
+    "Digestive System",
+    "Urinary System",
+    "Nervous System",
+    "Pathology and Laboratory",
+    "Evaluation and Management",
+]
+
+# Rows are written straight to the file a category at a time, so the
+# buffer only has to absorb the per-category writes
+WRITE_BUFFER_SIZE = 1 << 20
+
+# JSON string syntax is valid in TypeScript, so the C JSON encoder does the
+# quoting and escaping of emitted strings
+_TS_STRING = json.JSONEncoder(ensure_ascii=False).encode
+
+# Line breaks flattened out of names
+_STRIP = str.maketrans({'\n': ' ', '\r': ''})
+
+# Sort key for code records
+_BY_CODE = itemgetter('code')
+
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Start of an array literal assigned to a script variable: var x = [...]
+_JS_ARRAY_RE = re.compile(r'var\s+\w+\s*=\s*(?=\[)')
+
+# Reads each array literal through to its matching bracket with raw_decode
+_JSON_DECODER = json.JSONDecoder()
+
+# The API, table and script-tag passes often return the same codes, so the
+# same strings get categorized more than once per run
+@lru_cache(maxsize=65536)
 def categorize_code(code: str) -> str:
     """Categorize HCPCS code based on code pattern"""
     code_upper = code.upper().strip()
     
-    if code_upper.startswith('A'):
-        return "Medical and Surgical Supplies"
-    elif code_upper.startswith('B'):
-        return "Enteral and Parenteral Therapy"
-    elif code_upper.startswith('C'):
-        return "Temporary Codes"
-    elif code_upper.startswith('D'):
-        return "Dental Procedures"
-    elif code_upper.startswith('E'):
-        return "Durable Medical Equipment"
-    elif code_upper.startswith('G'):
-        return "Temporary Procedures/Professional Services"
-    elif code_upper.startswith('H'):
-        return "Alcohol and Drug Abuse Treatment Services"
-    elif code_upper.startswith('J'):
-        return "Drugs Administered Other Than Oral Method"
-    elif code_upper.startswith('K'):
-        return "Temporary Codes"
-    elif code_upper.startswith('L'):
-        return "Orthotic and Prosthetic Procedures"
-    elif code_upper.startswith('M'):
-        return "Medical Services"
-    elif code_upper.startswith('P'):
-        return "Pathology and Laboratory Services"
-    elif code_upper.startswith('Q'):
-        return "Temporary Codes"
-    elif code_upper.startswith('R'):
-        return "Diagnostic Radiology Services"
-    elif code_upper.startswith('S'):
-        return "Temporary National Codes"
-    elif code_upper.startswith('T'):
-        return "Temporary Codes"
-    elif code_upper.startswith('U'):
-        return "Clinical Laboratory Services"
-    elif code_upper.startswith('V'):
-        return "Vision Services"
+    category = _CATEGORY_MAP.get(code_upper[:1])
+    if category:
+        return category
     
-    numeric_part = re.sub(r'[^\d]', '', code_upper[:5])
+    numeric_part = _NON_DIGIT_RE.sub('', code_upper[:5])
     if numeric_part:
-        num = int(numeric_part)
-        if 10000 <= num <= 19999:
-            return "Integumentary System"
-        elif 20000 <= num <= 29999:
-            return "Musculoskeletal System"
-        elif 30000 <= num <= 39999:
-            return "Respiratory System"
-        elif 40000 <= num <= 49999:
-            return "Cardiovascular System"
-        elif 50000 <= num <= 59999:
-            return "Digestive System"
-        elif 60000 <= num <= 69999:
-            return "Urinary System"
-        elif 70000 <= num <= 79999:
-            return "Nervous System"
-        elif 80000 <= num <= 89999:
-            return "Pathology and Laboratory"
-        elif 90000 <= num <= 99999:
-            return "Evaluation and Management"
+        # At most five digits, so the index is always 0-9
+        category = _NUMERIC_CATS[int(numeric_part) // 10000]
+        if category:
+            return category
     
     return "Uncategorized"
 
+def read_json_response(response):
+    """Parse a JSON response, or return None if it is too small to be a code list"""
+    headers = response.headers
+    if 'json' not in headers.get('content-type', ''):
+        return None
+    length = headers.get('content-length', '')
+    if length.isdigit() and int(length) < MIN_JSON_BYTES:
+        return None
+    if HAS_ORJSON:
+        # Parses the raw bytes directly instead of decoding to str first
+        return orjson.loads(response.body())
+    return response.json()
+
 def intercept_api_calls(page):
     """Intercept network requests to find API endpoints"""
     api_data = []
@@ -90,18 +180,61 @@ def intercept_api_calls(page):
         url = response.url
         if 'api' in url.lower() or 'data' in url.lower() or 'codes' in url.lower():
             try:
-                if 'json' in response.headers.get('content-type', ''):
-                    data = response.json()
-                    if isinstance(data, list) and len(data) > 100:
-                        api_data.append(data)
-                    elif isinstance(data, dict) and ('codes' in data or 'data' in data):
-                        api_data.append(data.get('codes') or data.get('data'))
+                data = read_json_response(response)
+                if isinstance(data, list) and len(data) > 100:
+                    api_data.append(data)
+                elif isinstance(data, dict) and ('codes' in data or 'data' in data):
+                    api_data.append(data.get('codes') or data.get('data'))
             except:
                 pass
     
     page.on("response", handle_response)
     return api_data
 
+def codes_from_items(items: list) -> List[Dict[str, str]]:
+    """Convert JSON code records into code dicts"""
+    codes = []
+    for item in items:
+        if isinstance(item, dict):
+            code = item.get('code') or item.get('Code') or item.get('HCPCS')
+            name = item.get('name') or item.get('Name') or item.get('Description')
+            if code and name:
+                codes.append({
+                    'code': str(code).strip(),
+                    'name': str(name).strip(),
+                    'category': categorize_code(str(code))
+                })
+    return codes
+
+def wait_for_content(page, api_ready: threading.Event) -> bool:
+    """Wait until the code list arrives from the API or the table fills in.
+    
+    Returns True if the API list was captured.
+    """
+    # Sync Playwright only dispatches response handlers while it is inside an
+    # API call, so poll with short page waits instead of blocking on the event
+    deadline = time.monotonic() + CONTENT_WAIT_TIMEOUT
+    while not api_ready.is_set() and time.monotonic() < deadline:
+        if page.query_selector(_TABLE_FILLED):
+            break
+        page.wait_for_timeout(250)
+    return api_ready.is_set()
+
+def js_array_literals(content: str):
+    """Yield the JSON arrays assigned to variables in a script"""
+    pos = 0
+    while True:
+        match = _JS_ARRAY_RE.search(content, pos)
+        if not match:
+            return
+        try:
+            data, pos = _JSON_DECODER.raw_decode(content, match.end())
+        except ValueError:
+            # Not valid JSON (e.g. a JS expression), keep looking after it
+            pos = match.end()
+            continue
+        yield data
+
 def scrape_codes_from_page(page) -> List[Dict[str, str]]:
     """Scrape codes from the page"""
     codes = []
@@ -113,8 +246,11 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
     except:
         pass
     
-    # Give page time to load all data
-    page.wait_for_timeout(5000)
+    # Give page time to load all data, moving on as soon as the rows are there
+    try:
+        page.wait_for_function("document.querySelectorAll('table tr').length > 100", timeout=5000)
+    except PlaywrightTimeout:
+        pass
     
     # Try to find and click "Show all" or similar button
     try:
@@ -137,20 +273,27 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
                 if btn:
                     print(f"Clicking button: {btn.inner_text()}")
                     btn.click()
-                    page.wait_for_timeout(3000)
+                    try:
+                        page.wait_for_load_state("networkidle", timeout=3000)
+                    except PlaywrightTimeout:
+                        pass
                     break
             except:
                 continue
         
         # Also try all buttons
-        buttons = page.query_selector_all("button, a, [role='button']")
-        for btn in buttons:
+        # Read every button label in one call rather than one or two per button
+        buttons = page.locator("button, a, [role='button']")
+        for i, label in enumerate(buttons.all_inner_texts()):
             try:
-                text = btn.inner_text().lower()
+                text = label.lower()
                 if any(word in text for word in ['all', 'show', 'load', 'export', 'download', 'view all']):
-                    print(f"Clicking button: {btn.inner_text()}")
-                    btn.click()
-                    page.wait_for_timeout(3000)
+                    print(f"Clicking button: {label}")
+                    buttons.nth(i).click()
+                    try:
+                        page.wait_for_load_state("networkidle", timeout=3000)
+                    except PlaywrightTimeout:
+                        pass
                     break
             except:
                 continue
@@ -160,20 +303,33 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
     # Try infinite scroll to load all data
     print("Attempting to scroll to load all data...")
     try:
-        last_height = page.evaluate("document.body.scrollHeight")
+        last_height, last_row_count = page.evaluate(_PAGE_SIZE_JS)
         scroll_attempts = 0
         max_scrolls = 50
+        if last_row_count > FULL_TABLE_ROWS:
+            print(f"Table already has {last_row_count} rows, skipping scroll")
+            max_scrolls = 0
+        stalled = 0
         
         while scroll_attempts < max_scrolls:
             # Scroll to bottom
             page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            page.wait_for_timeout(2000)
+            try:
+                # Continue as soon as the page grows instead of always waiting
+                page.wait_for_function("h => document.body.scrollHeight > h", arg=last_height, timeout=2000)
+            except PlaywrightTimeout:
+                pass
             
             # Check if new content loaded
-            new_height = page.evaluate("document.body.scrollHeight")
-            if new_height == last_height:
+            new_height, row_count = page.evaluate(_PAGE_SIZE_JS)
+            if new_height == last_height or row_count > FULL_TABLE_ROWS:
+                break
+            # Stop once the table stops growing even if the page still does
+            # (late images or footer content), unless the rows aren't in a table
+            stalled = stalled + 1 if row_count and row_count == last_row_count else 0
+            if stalled >= 2:
                 break
-            last_height = new_height
+            last_height, last_row_count = new_height, row_count
             scroll_attempts += 1
             
             if scroll_attempts % 10 == 0:
@@ -184,7 +340,6 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
         print(f"Error during scroll: {e}")
     
     # Method 1: Try to extract from table (with multiple attempts)
-    all_rows = []
     try:
         # Try different table selectors
         table_selectors = [
@@ -196,39 +351,34 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
             ".data-table tr",
         ]
         
-        for selector in table_selectors:
-            rows = page.query_selector_all(selector)
-            if len(rows) > len(all_rows):
-                all_rows = rows
-                print(f"Found {len(rows)} rows using selector: {selector}")
+        counts, rows = page.evaluate(_TABLE_ROWS_JS, table_selectors)
+        best = 0
+        for selector, count in zip(table_selectors, counts):
+            if count > best:
+                best = count
+                print(f"Found {count} rows using selector: {selector}")
         
-        rows = all_rows
         if not rows:
-            rows = page.query_selector_all("table tr")
             print(f"Found {len(rows)} table rows (fallback)")
         
-        for i, row in enumerate(rows[1:], 1):  # Skip header
-            try:
-                cells = row.query_selector_all("td")
-                if len(cells) >= 2:
-                    code = cells[0].inner_text().strip()
-                    name = cells[1].inner_text().strip()
-                    category = cells[2].inner_text().strip() if len(cells) > 2 else None
+        for i, cells in enumerate(rows[1:], 1):  # Skip header
+            if len(cells) >= 2:
+                code = cells[0].strip()
+                name = cells[1].strip()
+                category = cells[2].strip() if len(cells) > 2 else None
+                
+                if code and name:
+                    if not category:
+                        category = categorize_code(code)
                     
-                    if code and name:
-                        if not category:
-                            category = categorize_code(code)
-                        
-                        codes.append({
-                            'code': code,
-                            'name': name,
-                            'category': category
-                        })
-                        
-                        if i % 100 == 0:
-                            print(f"  Scraped {i} codes from table...")
-            except:
-                continue
+                    codes.append({
+                        'code': code,
+                        'name': name,
+                        'category': category
+                    })
+                    
+                    if i % 100 == 0:
+                        print(f"  Scraped {i} codes from table...")
     except Exception as e:
         print(f"Error scraping table: {e}")
     
@@ -247,48 +397,28 @@ def scrape_codes_from_page(page) -> List[Dict[str, str]]:
         
         if js_data:
             print(f"Found data in window object: {len(js_data)} items")
-            for item in js_data:
-                if isinstance(item, dict):
-                    code = item.get('code') or item.get('Code') or item.get('HCPCS')
-                    name = item.get('name') or item.get('Name') or item.get('Description')
-                    if code and name:
-                        codes.append({
-                            'code': str(code).strip(),
-                            'name': str(name).strip(),
-                            'category': categorize_code(str(code))
-                        })
+            codes.extend(codes_from_items(js_data))
     except:
         pass
     
     # Method 3: Look for JSON in script tags
     try:
-        scripts = page.query_selector_all("script")
-        for script in scripts:
-            content = script.inner_text()
-            if content:
-                json_matches = re.findall(r'var\s+\w+\s*=\s*(\[.*?\]);', content, re.DOTALL)
-                for match in json_matches:
-                    try:
-                        data = json.loads(match)
-                        if isinstance(data, list) and len(data) > 100:
-                            print(f"Found JSON data in script: {len(data)} items")
-                            for item in data:
-                                if isinstance(item, dict):
-                                    code = item.get('code') or item.get('Code') or item.get('HCPCS')
-                                    name = item.get('name') or item.get('Name') or item.get('Description')
-                                    if code and name:
-                                        codes.append({
-                                            'code': str(code).strip(),
-                                            'name': str(name).strip(),
-                                            'category': categorize_code(str(code))
-                                        })
-                    except:
-                        continue
+        for content in page.evaluate(_ARRAY_SCRIPTS_JS):
+            for data in js_array_literals(content):
+                if len(data) > 100:
+                    print(f"Found JSON data in script: {len(data)} items")
+                    codes.extend(codes_from_items(data))
     except:
         pass
     
     return codes
 
+def name_literal(name: str) -> str:
+    """Quote a code name as a single-line TypeScript string literal"""
+    if '\n' in name or '\r' in name:
+        name = name.translate(_STRIP)
+    return _TS_STRING(name)
+
 def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/data/hcpcs_codes.ts"):
     """Generate TypeScript file from codes data"""
     
@@ -296,26 +426,23 @@ def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/dat
         print("No codes to generate!")
         return
     
-    # Remove duplicates
+    # Remove duplicates and group by category in one pass, keeping the first
+    # occurrence of each (code, name)
     seen = set()
-    unique_codes = []
+    categories = defaultdict(list)
     for code in codes:
         key = (code['code'], code['name'])
         if key not in seen:
             seen.add(key)
-            unique_codes.append(code)
+            categories[code.get('category', 'Uncategorized')].append(code)
     
-    # Group by category
-    categories = {}
-    for code in unique_codes:
-        cat = code.get('category', 'Uncategorized')
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(code)
+    sorted_categories = sorted(categories)
     
-    sorted_categories = sorted(categories.keys())
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    ts_content = """// HCPCS/CPT Codes from hcpcsdata.com
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("""// HCPCS/CPT Codes from hcpcsdata.com
 export interface HCPCSCode {
   code: string;
   name: string;
@@ -323,26 +450,28 @@ export interface HCPCSCode {
 }
 
 export const hcpcsCodes: HCPCSCode[] = [
-"""
-    
-    for category in sorted_categories:
-        ts_content += f"\n  // {category}\n"
-        for code in sorted(categories[category], key=lambda x: x['code']):
-            name = code['name'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ').replace('\r', '')
-            code_str = code['code'].replace('"', '\\"')
-            ts_content += f'  {{ code: "{code_str}", name: "{name}", category: "{category}" }},\n'
-    
-    ts_content += "\n];\n"
-    
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+""")
+        
+        for category in sorted_categories:
+            f.write(f"\n  // {category}\n")
+            row_end = f', category: {_TS_STRING(category)} }},\n'
+            f.write(''.join([
+                f'  {{ code: {_TS_STRING(code["code"])}, name: {name_literal(code["name"])}{row_end}'
+                for code in sorted(categories[category], key=_BY_CODE)
+            ]))
+        
+        f.write("\n];\n")
     
-    print(f"\n✓ Generated TypeScript file with {len(unique_codes)} codes in {len(categories)} categories")
+    print(f"\n✓ Generated TypeScript file with {len(seen)} codes in {len(categories)} categories")
     print(f"  Output: {output_path.absolute()}")
 
+def block_unused_resources(route):
+    """Abort requests for images, fonts and media; let everything else through"""
+    if route.request.resource_type in _BLOCKED_RESOURCES:
+        route.abort()
+    else:
+        route.continue_()
+
 def main():
     if not HAS_PLAYWRIGHT:
         print("ERROR: Playwright is required for web scraping.")
@@ -363,21 +492,24 @@ def main():
             user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             viewport={'width': 1920, 'height': 1080}
         )
+        context.route("**/*", block_unused_resources)
         page = context.new_page()
         
         # Set up response interception
         api_responses = []
+        api_ready = threading.Event()
         
         def handle_response(response):
             url = response.url
             if any(keyword in url.lower() for keyword in ['api', 'data', 'codes', 'hcpcs']):
                 try:
-                    if 'json' in response.headers.get('content-type', ''):
-                        data = response.json()
-                        if isinstance(data, list) and len(data) > 100:
-                            api_responses.append(('list', data))
-                        elif isinstance(data, dict):
-                            api_responses.append(('dict', data))
+                    data = read_json_response(response)
+                    if isinstance(data, list) and len(data) > 100:
+                        api_responses.append(('list', data))
+                        if len(data) > API_MIN_ITEMS:
+                            api_ready.set()
+                    elif isinstance(data, dict):
+                        api_responses.append(('dict', data))
                 except:
                     pass
         
@@ -396,20 +528,26 @@ def main():
             
             # Wait for dynamic content to load
             print("Waiting for content to load...")
-            page.wait_for_timeout(8000)
+            codes = []
+            if wait_for_content(page, api_ready):
+                # The full list came straight from the API, so skip the DOM
+                items = max((data for resp_type, data in api_responses if resp_type == 'list'), key=len)
+                print(f"Using API response with {len(items)} items")
+                codes = codes_from_items(items)
             
-            # Check if we got API responses
-            if api_responses:
-                print(f"Found {len(api_responses)} API responses")
-                for resp_type, data in api_responses:
-                    if resp_type == 'list' and len(data) > 100:
-                        print(f"  Found list with {len(data)} items")
-                    elif resp_type == 'dict':
-                        print(f"  Found dict with keys: {list(data.keys())}")
-            
-            # Scrape from page
-            print("Scraping codes from page...")
-            codes = scrape_codes_from_page(page)
+            if not codes:
+                # Check if we got API responses
+                if api_responses:
+                    print(f"Found {len(api_responses)} API responses")
+                    for resp_type, data in api_responses:
+                        if resp_type == 'list' and len(data) > 100:
+                            print(f"  Found list with {len(data)} items")
+                        elif resp_type == 'dict':
+                            print(f"  Found dict with keys: {list(data.keys())}")
+                
+                # Scrape from page
+                print("Scraping codes from page...")
+                codes = scrape_codes_from_page(page)
             
             if codes:
                 print(f"\n✓ Successfully scraped {len(codes)} codes")
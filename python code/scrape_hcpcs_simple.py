@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Alternative web scraper using requests and BeautifulSoup
+Alternative web scraper using requests and lxml
 for hcpcsdata.com that doesn't require Selenium.
 """
 import sys
@@ -8,83 +8,134 @@ import requests
 import time
 import json
 import re
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict
 from pathlib import Path
 
 try:
-    from bs4 import BeautifulSoup
-    HAS_BS4 = True
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
 except ImportError:
-    HAS_BS4 = False
-    print("BeautifulSoup4 not installed. Install with: pip install beautifulsoup4 lxml")
+    HAS_LXML = False
+    print("lxml not installed. Install with: pip install lxml")
 
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# Level II HCPCS categories by leading letter
+_CATEGORY_MAP = {
+    'A': "Medical and Surgical Supplies",
+    'B': "Enteral and Parenteral Therapy",
+    'C': "Temporary Codes",
+    'D': "Dental Procedures",
+    'E': "Durable Medical Equipment",
+    'G': "Temporary Procedures/Professional Services",
+    'H': "Alcohol and Drug Abuse Treatment Services",
+    'J': "Drugs Administered Other Than Oral Method",
+    'K': "Temporary Codes",
+    'L': "Orthotic and Prosthetic Procedures",
+    'M': "Medical Services",
+    'P': "Pathology and Laboratory Services",
+    'Q': "Temporary Codes",
+    'R': "Diagnostic Radiology Services",
+    'S': "Temporary National Codes",
+    'T': "Temporary Codes",
+    'U': "Clinical Laboratory Services",
+    'V': "Vision Services",
+}
+
+# Level I CPT categories indexed by ten-thousands digit (10000-19999 -> 1, ..., 90000-99999 -> 9)
+_NUMERIC_CATS = [
+    None,
+    "Integumentary System",
+    "Musculoskeletal System",
+    "Respiratory System",
+    "Cardiovascular System",
+    "Digestive System",
+    "Urinary System",
+    "Nervous System",
+    "Pathology and Laboratory",
+    "Evaluation and Management",
+]
+
+# Rows are written straight to the file a category at a time, so the
+# buffer only has to absorb the per-category writes
+WRITE_BUFFER_SIZE = 1 << 20
+
+# JSON string syntax is valid in TypeScript, so the C JSON encoder does the
+# quoting and escaping of emitted strings
+_TS_STRING = json.JSONEncoder(ensure_ascii=False).encode
+
+# Line breaks flattened out of names
+_STRIP = str.maketrans({'\n': ' ', '\r': ''})
+
+# Sort key for code records
+_BY_CODE = itemgetter('code')
+
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Start of an array literal assigned to a script variable: var x = [...]
+_JS_ARRAY_RE = re.compile(r'var\s+\w+\s*=\s*(?=\[)')
+
+# Reads each array literal through to its matching bracket with raw_decode
+_JSON_DECODER = json.JSONDecoder()
+
+if HAS_LXML:
+    # Rows of a table (including nested ones) and the cells of a row
+    _TABLE_ROWS = etree.XPath('.//tr')
+    _ROW_CELLS = etree.XPath('.//td | .//th')
+
+# The API, table and script-tag passes often return the same codes, so the
+# same strings get categorized more than once per run
+@lru_cache(maxsize=65536)
 def categorize_code(code: str) -> str:
     """Categorize HCPCS code based on code pattern"""
     code_upper = code.upper().strip()
     
-    if code_upper.startswith('A'):
-        return "Medical and Surgical Supplies"
-    elif code_upper.startswith('B'):
-        return "Enteral and Parenteral Therapy"
-    elif code_upper.startswith('C'):
-        return "Temporary Codes"
-    elif code_upper.startswith('D'):
-        return "Dental Procedures"
-    elif code_upper.startswith('E'):
-        return "Durable Medical Equipment"
-    elif code_upper.startswith('G'):
-        return "Temporary Procedures/Professional Services"
-    elif code_upper.startswith('H'):
-        return "Alcohol and Drug Abuse Treatment Services"
-    elif code_upper.startswith('J'):
-        return "Drugs Administered Other Than Oral Method"
-    elif code_upper.startswith('K'):
-        return "Temporary Codes"
-    elif code_upper.startswith('L'):
-        return "Orthotic and Prosthetic Procedures"
-    elif code_upper.startswith('M'):
-        return "Medical Services"
-    elif code_upper.startswith('P'):
-        return "Pathology and Laboratory Services"
-    elif code_upper.startswith('Q'):
-        return "Temporary Codes"
-    elif code_upper.startswith('R'):
-        return "Diagnostic Radiology Services"
-    elif code_upper.startswith('S'):
-        return "Temporary National Codes"
-    elif code_upper.startswith('T'):
-        return "Temporary Codes"
-    elif code_upper.startswith('U'):
-        return "Clinical Laboratory Services"
-    elif code_upper.startswith('V'):
-        return "Vision Services"
+    category = _CATEGORY_MAP.get(code_upper[:1])
+    if category:
+        return category
     
     # Level I CPT codes (numeric)
-    numeric_part = re.sub(r'[^\d]', '', code_upper[:5])
+    numeric_part = _NON_DIGIT_RE.sub('', code_upper[:5])
     if numeric_part:
-        num = int(numeric_part)
-        if 10000 <= num <= 19999:
-            return "Integumentary System"
-        elif 20000 <= num <= 29999:
-            return "Musculoskeletal System"
-        elif 30000 <= num <= 39999:
-            return "Respiratory System"
-        elif 40000 <= num <= 49999:
-            return "Cardiovascular System"
-        elif 50000 <= num <= 59999:
-            return "Digestive System"
-        elif 60000 <= num <= 69999:
-            return "Urinary System"
-        elif 70000 <= num <= 79999:
-            return "Nervous System"
-        elif 80000 <= num <= 89999:
-            return "Pathology and Laboratory"
-        elif 90000 <= num <= 99999:
-            return "Evaluation and Management"
+        # At most five digits, so the index is always 0-9
+        category = _NUMERIC_CATS[int(numeric_part) // 10000]
+        if category:
+            return category
     
     return "Uncategorized"
 
-def find_api_endpoint(session: requests.Session) -> str:
+def is_api_endpoint(url: str, headers: Dict[str, str]) -> bool:
+    """Check whether a URL returns the codes as JSON"""
+    try:
+        # Each probe gets its own session: probes still running after a match
+        # must not share connections with the caller's session
+        with requests.Session() as session, session.get(url, headers=headers, timeout=10) as r:
+            if r.status_code == 200:
+                content_type = r.headers.get('content-type', '')
+                if 'json' in content_type:
+                    try:
+                        data = r.json()
+                        if isinstance(data, list) and len(data) > 100:
+                            return True
+                        elif isinstance(data, dict) and ('codes' in data or 'data' in data):
+                            return True
+                    except:
+                        pass
+    except:
+        pass
+    
+    return False
+
+def find_api_endpoint() -> str:
     """Try to find the API endpoint that serves the codes"""
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
@@ -102,29 +153,61 @@ def find_api_endpoint(session: requests.Session) -> str:
         "/api/HCPCS",
         "/data/codes.json",
     ]
+    urls = [base_url + endpoint for endpoint in endpoints]
     
-    for endpoint in endpoints:
-        try:
-            url = base_url + endpoint
-            r = session.get(url, headers=headers, timeout=10)
-            if r.status_code == 200:
-                content_type = r.headers.get('content-type', '')
-                if 'json' in content_type:
-                    try:
-                        data = r.json()
-                        if isinstance(data, list) and len(data) > 100:
-                            print(f"Found API endpoint: {url}")
-                            return url
-                        elif isinstance(data, dict) and ('codes' in data or 'data' in data):
-                            print(f"Found API endpoint: {url}")
-                            return url
-                    except:
-                        pass
-        except:
-            continue
+    # Probe every endpoint at once but check results in list order, so the
+    # first working endpoint in the list still wins
+    executor = ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        results = executor.map(lambda url: is_api_endpoint(url, headers), urls)
+        for url, found in zip(urls, results):
+            if found:
+                print(f"Found API endpoint: {url}")
+                return url
+    finally:
+        # Don't wait on probes that are still running once one has matched
+        executor.shutdown(wait=False, cancel_futures=True)
     
     return None
 
+def iter_api_items(r: requests.Response):
+    """Yield the code records from an API response, streaming them with ijson when available"""
+    if HAS_IJSON:
+        # Parse straight off the socket; decode_content undoes any gzip encoding
+        r.raw.decode_content = True
+        events = ijson.parse(r.raw, use_float=True)
+        first = next(events, None)
+        if first is None:
+            return
+        events = chain([first], events)
+        if first[1] == 'start_array':
+            yield from ijson.items(events, 'item')
+            return
+        # Wrapped responses are built whole, then unwrapped below
+        data = next(ijson.items(events, ''), None)
+    else:
+        data = r.json()
+    
+    if isinstance(data, list):
+        yield from data
+    elif isinstance(data, dict):
+        yield from data.get('codes') or data.get('data') or []
+
+def js_array_literals(content: str):
+    """Yield the JSON arrays assigned to variables in a script"""
+    pos = 0
+    while True:
+        match = _JS_ARRAY_RE.search(content, pos)
+        if not match:
+            return
+        try:
+            data, pos = _JSON_DECODER.raw_decode(content, match.end())
+        except ValueError:
+            # Not valid JSON (e.g. a JS expression), keep looking after it
+            pos = match.end()
+            continue
+        yield data
+
 def scrape_from_html(session: requests.Session) -> List[Dict[str, str]]:
     """Scrape codes from HTML page"""
     headers = {
@@ -138,18 +221,16 @@ def scrape_from_html(session: requests.Session) -> List[Dict[str, str]]:
         r = session.get("https://www.hcpcsdata.com/Codes", headers=headers, timeout=30)
         r.raise_for_status()
         
-        soup = BeautifulSoup(r.text, 'lxml')
+        tree = lxml.html.fromstring(r.content)
         
         # Look for table
-        tables = soup.find_all('table')
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows[1:]:  # Skip header
-                cells = row.find_all(['td', 'th'])
+        for table in tree.iter('table'):
+            for row in _TABLE_ROWS(table)[1:]:  # Skip header
+                cells = _ROW_CELLS(row)
                 if len(cells) >= 2:
-                    code = cells[0].get_text(strip=True)
-                    name = cells[1].get_text(strip=True)
-                    category = cells[2].get_text(strip=True) if len(cells) > 2 else None
+                    code = cells[0].text_content().strip()
+                    name = cells[1].text_content().strip()
+                    category = cells[2].text_content().strip() if len(cells) > 2 else None
                     
                     if code and name:
                         if not category:
@@ -162,15 +243,12 @@ def scrape_from_html(session: requests.Session) -> List[Dict[str, str]]:
                         })
         
         # Also look for JSON data in script tags
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string:
+        for script in tree.iter('script'):
+            if script.text:
                 # Look for JSON arrays
-                json_matches = re.findall(r'var\s+\w+\s*=\s*(\[.*?\]);', script.string, re.DOTALL)
-                for match in json_matches:
+                for data in js_array_literals(script.text):
                     try:
-                        data = json.loads(match)
-                        if isinstance(data, list) and len(data) > 0:
+                        if len(data) > 0:
                             if isinstance(data[0], dict):
                                 first_item = data[0]
                                 if any(k.lower() in ['code', 'hcpcs'] for k in first_item.keys()):
@@ -192,6 +270,12 @@ def scrape_from_html(session: requests.Session) -> List[Dict[str, str]]:
     
     return codes
 
+def name_literal(name: str) -> str:
+    """Quote a code name as a single-line TypeScript string literal"""
+    if '\n' in name or '\r' in name:
+        name = name.translate(_STRIP)
+    return _TS_STRING(name)
+
 def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/data/hcpcs_codes.ts"):
     """Generate TypeScript file from codes data"""
     
@@ -207,9 +291,13 @@ def generate_typescript(codes: List[Dict[str, str]], output_file: str = "src/dat
             categories[cat] = []
         categories[cat].append(code)
     
-    sorted_categories = sorted(categories.keys())
+    sorted_categories = sorted(categories)
     
-    ts_content = """// HCPCS/CPT Codes from hcpcsdata.com
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("""// HCPCS/CPT Codes from hcpcsdata.com
 export interface HCPCSCode {
   code: string;
   name: string;
@@ -217,30 +305,25 @@ export interface HCPCSCode {
 }
 
 export const hcpcsCodes: HCPCSCode[] = [
-"""
-    
-    for category in sorted_categories:
-        ts_content += f"\n  // {category}\n"
-        for code in sorted(categories[category], key=lambda x: x['code']):
-            name = code['name'].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ').replace('\r', '')
-            code_str = code['code'].replace('"', '\\"')
-            ts_content += f'  {{ code: "{code_str}", name: "{name}", category: "{category}" }},\n'
-    
-    ts_content += "\n];\n"
-    
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+""")
+        
+        for category in sorted_categories:
+            f.write(f"\n  // {category}\n")
+            row_end = f', category: {_TS_STRING(category)} }},\n'
+            f.write(''.join([
+                f'  {{ code: {_TS_STRING(code["code"])}, name: {name_literal(code["name"])}{row_end}'
+                for code in sorted(categories[category], key=_BY_CODE)
+            ]))
+        
+        f.write("\n];\n")
     
     print(f"\n✓ Generated TypeScript file with {len(codes)} codes in {len(categories)} categories")
     print(f"  Output: {output_path.absolute()}")
 
 def main():
-    if not HAS_BS4:
-        print("ERROR: BeautifulSoup4 is required.")
-        print("Install with: pip install beautifulsoup4 lxml")
+    if not HAS_LXML:
+        print("ERROR: lxml is required.")
+        print("Install with: pip install lxml")
         sys.exit(1)
     
     print("Starting HCPCS codes scraper (simple version)...")
@@ -251,7 +334,7 @@ def main():
     
     # Try to find API endpoint first
     print("Looking for API endpoint...")
-    api_url = find_api_endpoint(session)
+    api_url = find_api_endpoint()
     
     if api_url:
         try:
@@ -259,26 +342,18 @@ def main():
                 'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
                 'Accept': 'application/json',
             }
-            r = session.get(api_url, headers=headers, timeout=30)
-            data = r.json()
-            
-            if isinstance(data, list):
-                codes_data = data
-            elif isinstance(data, dict):
-                codes_data = data.get('codes') or data.get('data') or []
-            else:
-                codes_data = []
-            
-            for item in codes_data:
-                if isinstance(item, dict):
-                    code = item.get('code') or item.get('Code') or item.get('HCPCS')
-                    name = item.get('name') or item.get('Name') or item.get('Description')
-                    if code and name:
-                        codes.append({
-                            'code': str(code).strip(),
-                            'name': str(name).strip(),
-                            'category': categorize_code(str(code))
-                        })
+            # Closing the streamed response hands its connection back to the pool
+            with session.get(api_url, headers=headers, timeout=30, stream=True) as r:
+                for item in iter_api_items(r):
+                    if isinstance(item, dict):
+                        code = item.get('code') or item.get('Code') or item.get('HCPCS')
+                        name = item.get('name') or item.get('Name') or item.get('Description')
+                        if code and name:
+                            codes.append({
+                                'code': str(code).strip(),
+                                'name': str(name).strip(),
+                                'category': categorize_code(str(code))
+                            })
             
             print(f"✓ Found {len(codes)} codes via API")
         except Exception as e:
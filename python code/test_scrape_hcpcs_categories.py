@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the progress file of scrape_hcpcs_categories.py
+"""
+import tempfile
+import unittest
+from pathlib import Path
+
+import scrape_hcpcs_categories as scraper
+
+
+class ProgressFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.original = scraper.PROGRESS_FILE
+        scraper.PROGRESS_FILE = Path(self.tmp.name) / "progress.jsonl"
+        self.addCleanup(setattr, scraper, 'PROGRESS_FILE', self.original)
+
+    def test_round_trips_names_with_unicode_line_separators(self):
+        saved = {
+            'A': [{'code': 'A0001', 'name': 'Line\u2028separator', 'category': scraper.categorize_code('A0001')}],
+            'B': [{'code': 'B0001', 'name': 'Next\x85line', 'category': scraper.categorize_code('B0001')}],
+            'E': [{'code': 'E0001', 'name': 'Paragraph\u2029separator', 'category': scraper.categorize_code('E0001')}],
+        }
+        with open(scraper.PROGRESS_FILE, 'w', encoding='utf-8') as log:
+            for category, codes in saved.items():
+                scraper.save_category(log, category, codes)
+
+        self.assertEqual(scraper.load_progress(), saved)
+
+    def test_skips_a_cut_off_last_line(self):
+        with open(scraper.PROGRESS_FILE, 'w', encoding='utf-8') as log:
+            scraper.save_category(log, 'A', [{'code': 'A0001', 'name': 'Ambulance', 'category': 'Medical and Surgical Supplies'}])
+            log.write('{"category": "B", "codes": [')
+
+        self.assertEqual(list(scraper.load_progress()), ['A'])
+        self.assertTrue(scraper.PROGRESS_FILE.read_text(encoding='utf-8').endswith('\n'))
+
+
+if __name__ == "__main__":
+    unittest.main()